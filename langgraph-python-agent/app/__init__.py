@@ -1,4 +1,13 @@
 # Marks 'app' as a package and exposes graph builder for external use (e.g., cloud runtimes)
-from app.graph import build_graph
+from typing import Any
 
 __all__ = ["build_graph"]
+
+
+def __getattr__(name: str) -> Any:
+    # Lazy so that importing app.* submodules doesn't pay for langgraph/langchain imports
+    if name == "build_graph":
+        from app.graph.graph import build_graph
+
+        return build_graph
+    raise AttributeError(name)
@@ -0,0 +1 @@
+"""Outbound campaigns: drive the proactive campaign graph over many contacts."""
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import orjson
+
+from app.core import metrics, tracing
+from app.core.state import CRM, State
+from app.core.store import contact_lock
+from app.graph.overload import NORMAL, overload
+from app.graph.scheduler import scheduler
+from app.tools import retries
+from app.tools.contacts import iter_contacts
+from app.tools.tenants import registry, use_location
+from app.web.schema import normalize_channel
+
+# Outbound campaigns: stream target contacts (a file or GHL list_contacts) through the
+# campaign graph with CAMPAIGN_CONCURRENCY runs in flight, at most CAMPAIGN_RATE contacts/s
+# per location. New runs wait while live traffic needs the process (scheduler queue,
+# overload) or the location's GHL rate window is down to CAMPAIGN_RATE_RESERVE requests.
+# Progress is checkpointed to CAMPAIGN_DIR/<name>.progress.json so a stopped run resumes.
+CAMPAIGN_DIR = os.getenv("CAMPAIGN_DIR", ".agent-state/campaigns")
+CAMPAIGN_CONCURRENCY = int(os.getenv("CAMPAIGN_CONCURRENCY", "16"))
+CAMPAIGN_RATE = float(os.getenv("CAMPAIGN_RATE", "20"))
+CAMPAIGN_RATE_RESERVE = int(os.getenv("CAMPAIGN_RATE_RESERVE", "20"))
+
+# (contact id, location id, full contact if the source had one)
+Target = Tuple[str, Optional[str], Optional[Dict[str, Any]]]
+# (index, contact id, location id) handed from the producer to workers; None stops a worker
+_Item = Optional[Tuple[int, str, Optional[str]]]
+
+
+async def iter_targets(
+    source: Union[str, List[str]], location_id: Optional[str] = None
+) -> AsyncIterator[Target]:
+    """
+    Contacts to message, in a stable order. ``source`` is "ghl" (every contact of the
+    location), a list of contact ids, or a file: JSONL (contacts as written by
+    scripts/contacts_sync.py export, or {"contact_id", "location_id"} objects) or one id per
+    line.
+    """
+    if isinstance(source, list):
+        for cid in source:
+            yield str(cid), location_id, None
+        return
+    if source == "ghl":
+        client = registry.get(location_id).client
+        async for contact in iter_contacts(client, location_id=location_id):
+            if contact.get("id"):
+                yield str(contact["id"]), location_id, contact
+        return
+    with open(source, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith(b"{"):
+                yield line.decode().split(",")[0].strip(), location_id, None
+                continue
+            d = orjson.loads(line)
+            cid = d.get("contact_id") or d.get("contactId") or d.get("id")
+            if cid:
+                loc = d.get("location_id") or d.get("locationId") or location_id
+                yield str(cid), loc, d if "id" in d else None
+
+
+class Progress:
+    """
+    Processed target positions: everything below ``done_below`` plus a sparse set above.
+    Positions whose send failed are processed but also listed in ``failed``, so a resumed
+    run tries them again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.done_below = 0
+        self.done: Set[int] = set()
+        self.failed: Set[int] = set()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                data = orjson.loads(f.read())
+            self.done_below = int(data.get("done_below", 0))
+            self.done = set(data.get("done", []))
+            self.failed = set(data.get("failed", []))
+
+    def is_done(self, i: int) -> bool:
+        return (i < self.done_below or i in self.done) and i not in self.failed
+
+    def mark(self, i: int, failed: bool = False) -> None:
+        if failed:
+            self.failed.add(i)
+        else:
+            self.failed.discard(i)
+        self.done.add(i)
+        while self.done_below in self.done:
+            self.done.discard(self.done_below)
+            self.done_below += 1
+
+    def save(self, stats: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({"done_below": self.done_below, "done": sorted(self.done),
+                                  "failed": sorted(self.failed), "stats": stats}))
+        os.replace(tmp, self.path)
+
+
+class _Pacer:
+    """Spaces run starts at ``rate`` per second; concurrent callers each reserve a slot."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next = time.monotonic()
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        at = max(self.next, now)
+        self.next = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+
+class Campaign:
+    """One outbound campaign run; ``run()`` to completion or ``start()`` in the background."""
+
+    def __init__(
+        self,
+        name: str,
+        source: Union[str, List[str]],
+        location_id: Optional[str] = None,
+        concurrency: int = CAMPAIGN_CONCURRENCY,
+        rate: float = CAMPAIGN_RATE,
+        message: Optional[str] = None,
+        channel: str = "sms",
+        graph: Any = None,
+    ) -> None:
+        self.name = name
+        self.source = source
+        self.location_id = location_id
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.message = message
+        self.channel = normalize_channel(channel)
+        if self.channel is None:
+            raise ValueError(f"Unknown channel: {channel}")
+        self._graph = graph
+        self.progress = Progress(os.path.join(CAMPAIGN_DIR, f"{name}.progress.json"))
+        self.stats: Dict[str, int] = {"sent": 0, "skipped": 0, "failed": 0, "previously_done": 0}
+        self.state = "pending"
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.paused_s = 0.0
+        self._pacers: Dict[Optional[str], _Pacer] = {}
+        self.task: Optional[asyncio.Task[Dict[str, Any]]] = None
+
+    def status(self) -> Dict[str, Any]:
+        elapsed = ((self.finished or time.monotonic()) - self.started) if self.started else 0.0
+        done = self.stats["sent"] + self.stats["skipped"] + self.stats["failed"]
+        return {
+            "name": self.name,
+            "state": self.state,
+            **self.stats,
+            "done": done,
+            "elapsed_s": round(elapsed, 1),
+            "per_s": round(done / elapsed, 2) if elapsed > 0 else 0.0,
+            "paused_s": round(self.paused_s, 1),
+        }
+
+    def start(self) -> asyncio.Task[Dict[str, Any]]:
+        self.task = asyncio.create_task(self.run())
+        return self.task
+
+    def stop(self) -> None:
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+    async def run(self, report: Optional[Callable[[Dict[str, Any]], None]] = None,
+                  report_every: float = 5.0) -> Dict[str, Any]:
+        if self._graph is None:
+            from app.graph.compiled import get_campaign_graph
+
+            self._graph = await asyncio.to_thread(get_campaign_graph)
+        self.state = "running"
+        self.started = time.monotonic()
+        queue: asyncio.Queue[_Item] = asyncio.Queue(self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        producer = asyncio.create_task(self._produce(queue, len(workers)))
+        reporter = asyncio.create_task(self._report(report, report_every))
+        try:
+            # A worker or the producer dying fails the campaign instead of leaving the other
+            # side blocked on the queue
+            pending: Set[asyncio.Task[None]] = {producer, *workers}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result()
+            self.state = "done"
+        except asyncio.CancelledError:
+            self.state = "stopped"
+            raise
+        except Exception:
+            self.state = "failed"
+            raise
+        finally:
+            producer.cancel()
+            for w in workers:
+                w.cancel()
+            reporter.cancel()
+            self.finished = time.monotonic()
+            self.progress.save(self.status())
+            if report is not None:
+                report(self.status())
+        return self.status()
+
+    async def _produce(self, queue: "asyncio.Queue[_Item]", workers: int) -> None:
+        async for i, (cid, loc, contact) in _enumerate(iter_targets(self.source, self.location_id)):
+            if self.progress.is_done(i):
+                self.stats["previously_done"] += 1
+                continue
+            if contact is not None:
+                # The source already has the contact; fetch_crm reads it from the cache
+                await registry.get(loc).contacts.aset(cid, contact)
+            await queue.put((i, cid, loc))
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def _worker(self, queue: "asyncio.Queue[_Item]") -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            i, cid, loc = item
+            await self._headroom(loc)
+            await self._pacers.setdefault(loc, _Pacer(self.rate)).wait()
+            result = await self._one(cid, loc)
+            self.stats[result] += 1
+            metrics.incr(f"campaign.{result}")
+            self.progress.mark(i, failed=result == "failed")
+
+    async def _headroom(self, location_id: Optional[str]) -> None:
+        # Live webhooks first: wait while they queue for scheduler slots, the process is
+        # degraded, or the location's GHL rate window is nearly used up
+        rate = registry.get(location_id).client.rate
+        while True:
+            now = time.monotonic()
+            low_rate = (rate.remaining is not None and rate.remaining <= CAMPAIGN_RATE_RESERVE
+                        and rate.reset_at > now)
+            if not (scheduler.depth > 0 or overload.level() > NORMAL or low_rate):
+                return
+            delay = min(max(rate.reset_at - now, 0.05), 1.0) if low_rate else 0.2
+            self.paused_s += delay
+            await asyncio.sleep(delay)
+
+    async def _one(self, contact_id: str, location_id: Optional[str]) -> str:
+        try:
+            state = State(
+                contact_id=contact_id,
+                channel=self.channel,
+                crm=CRM(location_id=location_id),
+                meta={"campaign": self.name, "message": self.message},
+            )
+            # Same per-contact lock as webhooks; the write key makes a resumed run skip the SMS
+            async with contact_lock(contact_id):
+                with use_location(location_id), retries.deadline(retries.WEBHOOK_DEADLINE_S), \
+                        retries.idempotency_scope(f"campaign:{self.name}:{contact_id}"), \
+                        tracing.trace("campaign", campaign=self.name, contact_id=contact_id):
+                    out = await self._graph.ainvoke(state)
+        except Exception:
+            return "failed"
+        meta = out["meta"] if isinstance(out, dict) else out.meta
+        return meta.get("campaign_result") or "failed"
+
+    async def _report(
+        self, report: Optional[Callable[[Dict[str, Any]], None]], every: float
+    ) -> None:
+        while True:
+            await asyncio.sleep(every)
+            self.progress.save(self.status())
+            if report is not None:
+                report(self.status())
+
+
+async def _enumerate(it: AsyncIterator[Target]) -> AsyncIterator[Tuple[int, Target]]:
+    i = 0
+    async for item in it:
+        yield i, item
+        i += 1
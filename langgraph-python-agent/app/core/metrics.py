@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict
+
+# Process-local counters and gauges, served as JSON by GET /metrics.
+# Names are dotted strings, e.g. "events.InboundMessage" or "overload.level".
+_counters: Dict[str, int] = defaultdict(int)
+_gauges: Dict[str, float] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    _gauges[name] = value
+
+
+def snapshot() -> Dict[str, Any]:
+    return {"counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def reset() -> None:
+    """Clear all metrics (used by scripts that run the app in-process)."""
+    _counters.clear()
+    _gauges.clear()
@@ -41,10 +41,11 @@ class State(BaseModel):
     latest_text: Optional[str] = None
     channel: Optional[Literal["sms", "facebook", "instagram"]] = None
 
-    crm: CRM = CRM()
-    nlp: NLP = NLP()
-    planner: Planner = Planner()
-    booking: Booking = Booking()
+    # default_factory avoids deep-copying a shared default instance on every construction
+    crm: CRM = Field(default_factory=CRM)
+    nlp: NLP = Field(default_factory=NLP)
+    planner: Planner = Field(default_factory=Planner)
+    booking: Booking = Field(default_factory=Booking)
 
     history: List[Turn] = Field(default_factory=list)
     meta: Dict[str, Any] = Field(default_factory=dict)
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Tuple
+
+import orjson
+
+from app.core import metrics
+
+# Shared state backend for caches, idempotency keys and per-contact locks.
+#   STORE_BACKEND=memory  (default) — process-local; fine for a single worker
+#   STORE_BACKEND=sqlite  — one SQLite file (STORE_PATH) shared by all local workers
+DEFAULT_PATH = ".agent-state/shared.db"
+# Expired keys (idempotency, GHL write results, caches) are mostly never read again; they
+# are deleted in bulk at most every STORE_PURGE_INTERVAL seconds, from set()
+STORE_PURGE_INTERVAL = float(os.getenv("STORE_PURGE_INTERVAL", "60"))
+
+
+class _AsyncOps:
+    """
+    Awaitable forms of the store operations, for callers on the event loop. Each runs
+    through ``_run``: inline for in-process stores, on a worker thread for blocking ones.
+    """
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return fn(*args)
+
+    async def aget(self, ns: str, key: str) -> Any:
+        return await self._run(self.get, ns, key)  # type: ignore[attr-defined]
+
+    async def aset(self, ns: str, key: str, value: Any, ttl: float) -> None:
+        await self._run(self.set, ns, key, value, ttl)  # type: ignore[attr-defined]
+
+    async def adelete(self, ns: str, key: str) -> None:
+        await self._run(self.delete, ns, key)  # type: ignore[attr-defined]
+
+    async def aadd(self, ns: str, key: str, ttl: float) -> bool:
+        return await self._run(self.add, ns, key, ttl)  # type: ignore[attr-defined]
+
+    async def atry_lease(self, name: str, owner: str, ttl: float) -> bool:
+        return await self._run(self.try_lease, name, owner, ttl)  # type: ignore[attr-defined]
+
+    async def arelease_lease(self, name: str, owner: str) -> None:
+        await self._run(self.release_lease, name, owner)  # type: ignore[attr-defined]
+
+
+class MemoryStore(_AsyncOps):
+    """Process-local store with TTLs."""
+
+    def __init__(self) -> None:
+        self._data: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._leases: Dict[str, Tuple[str, float]] = {}
+        self._next_purge = time.time() + STORE_PURGE_INTERVAL
+
+    def get(self, ns: str, key: str) -> Any:
+        item = self._data.get((ns, key))
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.time():
+            self._data.pop((ns, key), None)
+            return None
+        return value
+
+    def set(self, ns: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        if now >= self._next_purge:
+            self.purge()
+        self._data[(ns, key)] = (now + ttl, value)
+
+    def delete(self, ns: str, key: str) -> None:
+        self._data.pop((ns, key), None)
+
+    def add(self, ns: str, key: str, ttl: float) -> bool:
+        """Set ``key`` only if absent (or expired). Returns True if this call created it."""
+        if self.get(ns, key) is not None:
+            return False
+        self.set(ns, key, 1, ttl)
+        return True
+
+    def try_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        held = self._leases.get(name)
+        if held is not None and held[0] != owner and held[1] > now:
+            return False
+        self._leases[name] = (owner, now + ttl)
+        return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        held = self._leases.get(name)
+        if held is not None and held[0] == owner:
+            del self._leases[name]
+
+    def purge(self) -> int:
+        now = time.time()
+        self._next_purge = now + STORE_PURGE_INTERVAL
+        expired = [k for k, (exp, _) in self._data.items() if exp < now]
+        for k in expired:
+            del self._data[k]
+        for name in [n for n, (_, exp) in self._leases.items() if exp < now]:
+            del self._leases[name]
+        return len(expired)
+
+
+class SqliteStore(_AsyncOps):
+    """
+    Store backed by a local SQLite file in WAL mode, shared by every worker process on
+    the host. Values are orjson-encoded; operations are single statements, so they are
+    atomic across processes. sqlite3 blocks (on disk and on the busy timeout of other
+    workers' writes), so async callers use the a* methods, which run on a worker thread
+    with its own connection.
+    """
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = time.time() + STORE_PURGE_INTERVAL
+        with self._conn() as cx:
+            cx.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS kv (
+                    ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB, expires REAL NOT NULL,
+                    PRIMARY KEY (ns, key)
+                );
+                CREATE TABLE IF NOT EXISTS leases (
+                    name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL
+                );
+                """
+            )
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(fn, *args)
+
+    def _conn(self) -> sqlite3.Connection:
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            cx = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            cx.execute("PRAGMA journal_mode=WAL")
+            cx.execute("PRAGMA synchronous=NORMAL")
+            self._local.cx = cx
+        return cx
+
+    def get(self, ns: str, key: str) -> Any:
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ? AND expires >= ?",
+            (ns, key, time.time()),
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, ns: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        if now >= self._next_purge:
+            self.purge()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+            (ns, key, orjson.dumps(value), now + ttl),
+        )
+
+    def delete(self, ns: str, key: str) -> None:
+        self._conn().execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+
+    def add(self, ns: str, key: str, ttl: float) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO kv (ns, key, value, expires) VALUES (?, ?, '1', ?) "
+            "ON CONFLICT (ns, key) DO UPDATE "
+            "SET value = excluded.value, expires = excluded.expires WHERE kv.expires < ?",
+            (ns, key, now + ttl, now),
+        )
+        return cur.rowcount == 1
+
+    def try_lease(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.expires < ? OR leases.owner = excluded.owner",
+            (name, owner, now + ttl, now),
+        )
+        return cur.rowcount == 1
+
+    def release_lease(self, name: str, owner: str) -> None:
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def purge(self) -> int:
+        now = time.time()
+        self._next_purge = now + STORE_PURGE_INTERVAL
+        cx = self._conn()
+        cx.execute("DELETE FROM leases WHERE expires < ?", (now,))
+        return cx.execute("DELETE FROM kv WHERE expires < ?", (now,)).rowcount
+
+
+_store: Any = None
+_store_lock = threading.Lock()
+
+
+def backend() -> str:
+    return os.getenv("STORE_BACKEND", "memory").lower()
+
+
+def get_store() -> Any:
+    """Return the process-wide store selected by STORE_BACKEND."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if backend() == "sqlite":
+                    _store = SqliteStore(os.getenv("STORE_PATH", DEFAULT_PATH))
+                else:
+                    _store = MemoryStore()
+    return _store
+
+
+# In-process locks serialize same-contact runs within a worker; the store lease extends
+# that across workers when the backend is shared. The lease is renewed every ttl/3 while
+# the holder runs, so a run longer than ttl keeps it; ttl only bounds how long a crashed
+# worker's lease blocks the contact.
+_local_locks: Dict[str, asyncio.Lock] = {}
+_OWNER = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+@asynccontextmanager
+async def contact_lock(contact_id: str, ttl: float = 120.0) -> AsyncIterator[None]:
+    """Serialize graph runs for one contact (checkpoints are per contact thread)."""
+    lock = _local_locks.setdefault(contact_id, asyncio.Lock())
+    async with lock:
+        store = get_store()
+        name = f"contact:{contact_id}"
+        shared = not isinstance(store, MemoryStore)
+        if shared:
+            delay = 0.005
+            while not await store.atry_lease(name, _OWNER, ttl):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.1)
+            renew = asyncio.create_task(_renew_lease(store, name, ttl))
+        try:
+            yield
+        finally:
+            if shared:
+                renew.cancel()
+                await store.arelease_lease(name, _OWNER)
+            if not lock._waiters:
+                _local_locks.pop(contact_id, None)
+
+
+async def _renew_lease(store: Any, name: str, ttl: float) -> None:
+    while True:
+        await asyncio.sleep(ttl / 3)
+        try:
+            if not await store.atry_lease(name, _OWNER, ttl):
+                metrics.incr("store.lease_lost")
+        except Exception:
+            metrics.incr("store.lease_renew_errors")
@@ -0,0 +1,353 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# In-process tracing of graph runs: node, GHL and LLM spans are appended to the run's trace
+# and, once the run ends, a tail-based decision keeps it when it failed (any span raised),
+# took TRACE_SLOW_MS or more, or was picked at TRACE_SAMPLE_RATE. Kept traces go to a ring
+# buffer of the last TRACE_BUFFER (served by GET /debug/traces) and, with
+# TRACE_EXPORT=langsmith, are shipped to LangSmith from a background thread. Other traces are
+# dropped without any I/O. TRACING=0 turns span capture off.
+TRACING = os.getenv("TRACING", "1") != "0"
+TRACE_BUFFER = int(os.getenv("TRACE_BUFFER", "200"))
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "3000"))
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "256"))
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+TRACE_EXPORT_MAX = int(os.getenv("TRACE_EXPORT_MAX", "1000"))
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "2"))
+# LangChain's own tracer (LANGCHAIN_TRACING_V2 / LANGSMITH_TRACING) already ships every run;
+# exporting kept traces on top would send them twice, so the exporter stays off then
+LANGCHAIN_TRACING = any(
+    os.getenv(k, "").lower() == "true" for k in ("LANGCHAIN_TRACING_V2", "LANGSMITH_TRACING")
+)
+EXPORT_LANGSMITH = TRACE_EXPORT == "langsmith" and not LANGCHAIN_TRACING
+
+
+class Span:
+    __slots__ = ("name", "kind", "parent", "start", "end", "error", "attrs")
+
+    def __init__(self, name: str, kind: str, parent: Optional[Span], attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.kind = kind  # LangSmith run type: chain | tool | llm
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.attrs = attrs
+
+
+class Trace:
+    __slots__ = (
+        "id", "name", "wall", "start", "end", "error", "attrs", "outputs", "spans", "reason"
+    )
+
+    def __init__(self, name: str, attrs: Dict[str, Any]) -> None:
+        self.id = uuid.uuid4()
+        self.name = name
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.attrs = attrs
+        self.outputs: Dict[str, Any] = {}
+        # Appends from concurrent tasks/threads are atomic under the GIL; no lock needed
+        self.spans: List[Span] = []
+        self.reason: Optional[str] = None
+
+    @property
+    def ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        index = {id(s): i for i, s in enumerate(self.spans)}
+        return {
+            "id": str(self.id),
+            "name": self.name,
+            "t": self.wall,
+            "ms": round(self.ms, 3),
+            "reason": self.reason,
+            "error": self.error,
+            "attrs": self.attrs,
+            "outputs": self.outputs,
+            "spans": [
+                {
+                    "name": s.name,
+                    "kind": s.kind,
+                    "parent": index.get(id(s.parent)) if s.parent is not None else None,
+                    "offset_ms": round((s.start - self.start) * 1000, 3),
+                    "ms": round(((s.end or s.start) - s.start) * 1000, 3),
+                    "error": s.error,
+                    "attrs": s.attrs,
+                }
+                for s in self.spans
+            ],
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[Optional[Span]] = ContextVar("trace_parent", default=None)
+
+# Ring buffers of kept traces (oldest fall off). deque appends/pops are atomic, so the request
+# path never takes a lock; the exporter thread pops from _pending.
+_kept: Deque[Trace] = deque(maxlen=max(1, TRACE_BUFFER))
+_pending: Deque[Trace] = deque(maxlen=max(1, TRACE_EXPORT_MAX))
+_exporter: Optional[threading.Thread] = None
+_exporter_lock = threading.Lock()
+
+
+def _decide(tr: Trace) -> Optional[str]:
+    if tr.error or any(s.error for s in tr.spans):
+        return "error"
+    if tr.ms >= TRACE_SLOW_MS:
+        return "slow"
+    if TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _finish(tr: Trace) -> None:
+    metrics.incr("tracing.traces")
+    tr.reason = _decide(tr)
+    if tr.reason is None:
+        return
+    metrics.incr(f"tracing.kept.{tr.reason}")
+    _kept.append(tr)
+    if EXPORT_LANGSMITH:
+        if len(_pending) == _pending.maxlen:
+            metrics.incr("tracing.export_dropped")
+        _pending.append(tr)
+        _start_exporter()
+
+
+@contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Optional[Trace]]:
+    """Trace one run; spans opened inside (in this task or tasks it spawns) attach to it."""
+    if not TRACING:
+        yield None
+        return
+    tr = Trace(name, attrs)
+    token = _trace.set(tr)
+    parent_token = _parent.set(None)
+    try:
+        yield tr
+    except BaseException as e:
+        tr.error = repr(e)[:500]
+        raise
+    finally:
+        _parent.reset(parent_token)
+        _trace.reset(token)
+        tr.end = time.perf_counter()
+        _finish(tr)
+
+
+@contextmanager
+def span(name: str, kind: str = "chain", **attrs: Any) -> Iterator[Optional[Span]]:
+    """Record a child span of the current trace; a no-op outside a trace."""
+    tr = _trace.get()
+    if tr is None or len(tr.spans) >= TRACE_MAX_SPANS:
+        yield None
+        return
+    s = Span(name, kind, _parent.get(), attrs)
+    tr.spans.append(s)
+    token = _parent.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = repr(e)[:500]
+        raise
+    finally:
+        _parent.reset(token)
+        s.end = time.perf_counter()
+
+
+def traced(name: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a graph node (sync or async) in a span."""
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def run_async(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return run_async
+
+    @functools.wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> Any:
+        with span(name):
+            return fn(*args, **kwargs)
+
+    return run
+
+
+def recent(
+    limit: int = 20, min_ms: float = 0.0, reason: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Kept traces, newest first."""
+    out: List[Dict[str, Any]] = []
+    for tr in reversed(list(_kept)):
+        if tr.ms < min_ms or (reason and tr.reason != reason):
+            continue
+        out.append(tr.to_dict())
+        if len(out) >= limit:
+            break
+    return out
+
+
+class TracingGhl:
+    """Proxy around GhlClient that records a "tool" span per API call."""
+
+    def __init__(self, inner: Any) -> None:
+        self._inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._inner, name)
+        if name.startswith("_") or not callable(attr) or name in ("warm", "aclose"):
+            return attr
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            with span(f"ghl.{name}", "tool"):
+                return await attr(*args, **kwargs)
+
+        return call
+
+
+class TracingLLM:
+    """Proxy around a chat model that records an "llm" span (model, token usage) per call."""
+
+    def __init__(self, inner: Any) -> None:
+        self._inner = inner
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        model = getattr(self._inner, "model_name", None) or type(self._inner).__name__
+        with span("llm", "llm", model=model) as s:
+            res = await self._inner.ainvoke(*args, **kwargs)
+            usage = getattr(res, "usage_metadata", None)
+            if s is not None and usage:
+                s.attrs["tokens"] = {k: usage.get(k) for k in ("input_tokens", "output_tokens")}
+            return res
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._inner, name)
+
+
+# LangSmith export (kept traces only)
+
+
+def _stamp(wall: float) -> datetime:
+    return datetime.fromtimestamp(wall, tz=timezone.utc)
+
+
+def _to_runs(tr: Trace, project: str) -> List[Dict[str, Any]]:
+    """Convert a trace into LangSmith run dicts (root + one child run per span)."""
+    trace_id = str(tr.id)
+    root_start = _stamp(tr.wall)
+    root_order = f"{root_start:%Y%m%dT%H%M%S%fZ}{trace_id}"
+    runs = [{
+        "id": trace_id,
+        "trace_id": trace_id,
+        "dotted_order": root_order,
+        "session_name": project,
+        "name": tr.name,
+        "run_type": "chain",
+        "start_time": root_start,
+        "end_time": root_start + timedelta(milliseconds=tr.ms),
+        "inputs": tr.attrs,
+        "outputs": tr.outputs,
+        "error": tr.error,
+        "extra": {"metadata": {"sample_reason": tr.reason}},
+    }]
+    ids: Dict[int, str] = {}
+    orders: Dict[int, str] = {}
+    # Parents are appended before their children, so one pass resolves the tree
+    for s in tr.spans:
+        run_id = str(uuid.uuid4())
+        start = root_start + timedelta(seconds=s.start - tr.start)
+        parent_id = ids.get(id(s.parent), trace_id) if s.parent is not None else trace_id
+        parent_order = orders.get(id(s.parent), root_order) if s.parent is not None else root_order
+        order = f"{parent_order}.{start:%Y%m%dT%H%M%S%fZ}{run_id}"
+        ids[id(s)], orders[id(s)] = run_id, order
+        runs.append({
+            "id": run_id,
+            "trace_id": trace_id,
+            "parent_run_id": parent_id,
+            "dotted_order": order,
+            "session_name": project,
+            "name": s.name,
+            "run_type": s.kind,
+            "start_time": start,
+            "end_time": start + timedelta(seconds=(s.end or s.start) - s.start),
+            "inputs": s.attrs,
+            "outputs": {},
+            "error": s.error,
+        })
+    return runs
+
+
+def _take() -> List[Trace]:
+    batch: List[Trace] = []
+    while _pending and len(batch) < 50:
+        batch.append(_pending.popleft())
+    return batch
+
+
+def flush() -> None:
+    """Ship pending traces to LangSmith (blocking; the exporter thread calls this)."""
+    from langsmith import Client
+
+    project = os.getenv("LANGCHAIN_PROJECT", "ghl-agency-prod")
+    client = Client(auto_batch_tracing=False)
+    while True:
+        batch = _take()
+        if not batch:
+            return
+        try:
+            client.batch_ingest_runs(create=[r for tr in batch for r in _to_runs(tr, project)])
+            metrics.incr("tracing.exported", len(batch))
+        except Exception:
+            metrics.incr("tracing.export_errors")
+            return
+
+
+def _export_loop() -> None:
+    while True:
+        time.sleep(TRACE_EXPORT_INTERVAL)
+        if _pending:
+            try:
+                flush()
+            except Exception:
+                metrics.incr("tracing.export_errors")
+
+
+def check_export() -> None:
+    """Warn at startup when TRACE_EXPORT=langsmith is off because LangChain tracing is on."""
+    if TRACE_EXPORT == "langsmith" and LANGCHAIN_TRACING:
+        logger.warning(
+            "TRACE_EXPORT=langsmith ignored: LangChain tracing is on and already ships every "
+            "run; set LANGCHAIN_TRACING_V2=false to export only kept traces"
+        )
+
+
+def _start_exporter() -> None:
+    global _exporter
+    if _exporter is not None:
+        return
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+            _exporter.start()
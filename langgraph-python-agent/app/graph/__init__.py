@@ -1,5 +1,14 @@
 """Graph construction and compiled entrypoints."""
 
-from .graph import build_graph
+from typing import Any
 
 __all__ = ["build_graph"]
+
+
+def __getattr__(name: str) -> Any:
+    # Imported lazily: building the graph pulls in langgraph and langchain_openai
+    if name == "build_graph":
+        from .graph import build_graph
+
+        return build_graph
+    raise AttributeError(name)
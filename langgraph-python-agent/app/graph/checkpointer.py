@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Sequence, Set, Tuple, Union
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.core import metrics
+
+# In-memory checkpointer limits (used when no shared checkpointer is configured)
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "1"))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", "86400"))
+CHECKPOINT_MAX_MB = float(os.getenv("CHECKPOINT_MAX_MB", "256"))
+
+# (thread id, namespace, channel, version) and (thread id, namespace, checkpoint id)
+_BlobKey = Tuple[str, str, str, Union[str, int, float]]
+_WriteKey = Tuple[str, str, str]
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """
+    InMemorySaver that keeps memory bounded for long-running single-node deployments.
+
+    Only the latest ``keep`` checkpoints of each thread are retained (older ones, their
+    pending writes and unreferenced channel blobs are dropped), threads idle for ``ttl``
+    seconds are evicted, and when the serialized size of all threads exceeds ``max_bytes``
+    the least recently used threads are evicted. An evicted contact starts a fresh thread.
+    """
+
+    def __init__(
+        self,
+        *,
+        serde: Any = None,
+        keep: int = CHECKPOINT_KEEP,
+        ttl: float = CHECKPOINT_TTL,
+        max_bytes: int = int(CHECKPOINT_MAX_MB * 1024 * 1024),
+    ) -> None:
+        super().__init__(serde=serde)
+        self.keep = max(1, keep)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._mu = threading.RLock()
+        # thread id -> last use (monotonic), least recently used first
+        self._lru: "OrderedDict[str, float]" = OrderedDict()
+        self._bytes: Dict[str, int] = {}
+        self._total = 0
+        self._versions: Dict[_WriteKey, Dict[str, Any]] = {}
+        self._blob_keys: Dict[str, Set[_BlobKey]] = {}
+        self._write_keys: Dict[str, Set[_WriteKey]] = {}
+        self.evicted = {"ttl": 0, "lru": 0}
+
+    # -- LangGraph checkpointer API ---------------------------------------------------
+
+    def get_tuple(self, config: Any) -> Any:
+        with self._mu:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id not in self._lru:
+                return None  # unknown or evicted; avoid creating an empty defaultdict entry
+            self._lru[thread_id] = time.monotonic()
+            self._lru.move_to_end(thread_id)
+            return super().get_tuple(config)
+
+    def put(self, config: Any, checkpoint: Any, metadata: Any, new_versions: Any) -> Any:
+        with self._mu:
+            thread_id = config["configurable"]["thread_id"]
+            ns = config["configurable"]["checkpoint_ns"]
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._blob_keys.setdefault(thread_id, set()).update(
+                (thread_id, ns, k, v) for k, v in new_versions.items()
+            )
+            self._versions[(thread_id, ns, checkpoint["id"])] = dict(checkpoint["channel_versions"])
+            self._prune(thread_id, ns)
+            self._account(thread_id)
+            self._lru[thread_id] = time.monotonic()
+            self._lru.move_to_end(thread_id)
+            self._evict()
+            return result
+
+    def put_writes(
+        self, config: Any, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = ""
+    ) -> None:
+        with self._mu:
+            thread_id = config["configurable"]["thread_id"]
+            ns = config["configurable"].get("checkpoint_ns", "")
+            checkpoint_id = config["configurable"]["checkpoint_id"]
+            retained = self.storage.get(thread_id, {}).get(ns)
+            if retained and checkpoint_id < min(retained):
+                return  # late writes for a checkpoint that was already pruned
+            super().put_writes(config, writes, task_id, task_path)
+            self._write_keys.setdefault(thread_id, set()).add((thread_id, ns, checkpoint_id))
+            self._account(thread_id)
+            self._lru[thread_id] = time.monotonic()
+            self._lru.move_to_end(thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._mu:
+            self.storage.pop(thread_id, None)
+            for write_key in self._write_keys.pop(thread_id, ()):
+                self.writes.pop(write_key, None)
+            for blob_key in self._blob_keys.pop(thread_id, ()):
+                self.blobs.pop(blob_key, None)
+            for key in [k for k in self._versions if k[0] == thread_id]:
+                del self._versions[key]
+            self._total -= self._bytes.pop(thread_id, 0)
+            self._lru.pop(thread_id, None)
+
+    # -- bookkeeping ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, Any]:
+        return {"threads": len(self._lru), "bytes": self._total, "evicted": dict(self.evicted)}
+
+    def _prune(self, thread_id: str, ns: str) -> None:
+        checkpoints = self.storage[thread_id][ns]
+        if len(checkpoints) <= self.keep:
+            return
+        # Checkpoint ids are time-ordered (uuid6), like InMemorySaver's max() for "latest"
+        for cid in sorted(checkpoints)[: -self.keep]:
+            del checkpoints[cid]
+            self._versions.pop((thread_id, ns, cid), None)
+            self.writes.pop((thread_id, ns, cid), None)
+            self._write_keys.get(thread_id, set()).discard((thread_id, ns, cid))
+        live = {
+            (ch, ver)
+            for cid in checkpoints
+            for ch, ver in self._versions.get((thread_id, ns, cid), {}).items()
+        }
+        keys = self._blob_keys.get(thread_id, set())
+        for key in [k for k in keys if k[1] == ns and (k[2], k[3]) not in live]:
+            keys.discard(key)
+            self.blobs.pop(key, None)
+
+    def _account(self, thread_id: str) -> None:
+        size = 0
+        for saved in self.storage.get(thread_id, {}).values():
+            for checkpoint, meta, _parent in saved.values():
+                size += len(checkpoint[1]) + len(meta[1])
+        for blob_key in self._blob_keys.get(thread_id, ()):
+            blob = self.blobs.get(blob_key)
+            if blob is not None:
+                size += len(blob[1])
+        for write_key in self._write_keys.get(thread_id, ()):
+            for _task, _ch, value, _path in self.writes.get(write_key, {}).values():
+                size += len(value[1])
+        self._total += size - self._bytes.get(thread_id, 0)
+        self._bytes[thread_id] = size
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._lru:
+            thread_id, used = next(iter(self._lru.items()))
+            if now - used < self.ttl:
+                break
+            self.delete_thread(thread_id)
+            self.evicted["ttl"] += 1
+            metrics.incr("checkpoint.evicted.ttl")
+        # Never evict the thread that was just written (last in LRU order)
+        while self._total > self.max_bytes and len(self._lru) > 1:
+            self.delete_thread(next(iter(self._lru)))
+            self.evicted["lru"] += 1
+            metrics.incr("checkpoint.evicted.lru")
+        metrics.set_gauge("checkpoint.threads", len(self._lru))
+        metrics.set_gauge("checkpoint.bytes", self._total)
+
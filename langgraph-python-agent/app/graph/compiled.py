@@ -1,6 +1,118 @@
 from __future__ import annotations
 
-# Expose a compiled LangGraph instance as a module-level variable for the CLI
-from app.graph.graph import build_graph
+import os
+import threading
+import time
+from typing import Any, Optional, Tuple
 
-graph = build_graph()
+from app.core import metrics, tracing
+from app.core.store import backend
+from app.replay import recorder
+from app.tools.tenants import TenantGhl
+
+# Process-wide compiled graph shared by the CLI entrypoint and the web app.
+# Built on first access so importing this module stays cheap (langgraph/langchain_openai
+# are only imported by build_graph).
+_graph: Any = None
+_campaign_graph: Any = None
+_ghl: Optional[TenantGhl] = None
+_checkpointer: Any = None
+_lock = threading.Lock()
+
+
+def _make_checkpointer() -> Any:
+    """Shared SQLite checkpointer when STORE_BACKEND=sqlite; None keeps the in-memory saver."""
+    if backend() != "sqlite":
+        return None
+    import asyncio
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        # No loop (e.g. LangGraph CLI import); the platform provides its own persistence
+        return None
+    import aiosqlite
+    from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+    from app.graph.serde import StateSerializer
+
+    path = os.getenv("CHECKPOINT_PATH", ".agent-state/checkpoints.db")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Must be created on the event loop thread; the connection opens on first use
+    return AsyncSqliteSaver(aiosqlite.connect(path, timeout=30.0), serde=StateSerializer())
+
+
+def _traced_clients(ghl: Any, small: Any, big: Any) -> Tuple[Any, Any, Any]:
+    if not tracing.TRACING:
+        return ghl, small, big
+    # GHL and LLM spans for the run's trace
+    return (tracing.TracingGhl(ghl), small and tracing.TracingLLM(small),
+            big and tracing.TracingLLM(big))
+
+
+def get_graph() -> Any:
+    """Return the shared compiled graph, building it on first use."""
+    global _graph, _ghl, _checkpointer
+    if _graph is None:
+        with _lock:
+            if _graph is None:
+                start = time.perf_counter()
+                from app.graph.graph import build_graph, make_llms
+
+                if _checkpointer is None:
+                    _checkpointer = _make_checkpointer()
+                # Forwards to the webhook's location client (app/tools/tenants.py)
+                _ghl = TenantGhl()
+                ghl, small, big = _traced_clients(_ghl, *make_llms())
+                if recorder.enabled():
+                    # RECORD_DIR set: capture GHL responses and LLM completions per webhook
+                    ghl = recorder.RecordingGhl(ghl)
+                    small = small and recorder.RecordingLLM(small)
+                    big = big and recorder.RecordingLLM(big)
+                _graph = build_graph(checkpointer=_checkpointer, ghl=ghl, llms=(small, big))
+                metrics.set_gauge("startup.graph_build_seconds", time.perf_counter() - start)
+    return _graph
+
+
+def get_campaign_graph() -> Any:
+    """Return the shared outbound campaign graph (app/graph/graph.py:build_campaign_graph)."""
+    global _campaign_graph
+    if _campaign_graph is None:
+        with _lock:
+            if _campaign_graph is None:
+                from app.graph.graph import build_campaign_graph, make_llms
+
+                ghl, small, big = _traced_clients(_ghl or TenantGhl(), *make_llms())
+                _campaign_graph = build_campaign_graph(ghl=ghl, llms=(small, big))
+    return _campaign_graph
+
+
+async def warm_up() -> None:
+    """Import heavy deps, compile the graph, build LLM clients and open the GHL pool."""
+    import asyncio
+
+    global _checkpointer
+    start = time.perf_counter()
+    if _checkpointer is None:
+        _checkpointer = _make_checkpointer()
+    # Imports + compile are CPU-bound; keep the event loop free for /health meanwhile
+    await asyncio.to_thread(get_graph)
+    # GHL_WARM=0 skips the network round-trip (CI, offline benchmarks)
+    if _ghl is not None and os.getenv("GHL_WARM", "1") != "0":
+        await _ghl.warm()
+    metrics.set_gauge("startup.warm_seconds", time.perf_counter() - start)
+
+
+async def shutdown() -> None:
+    if _ghl is not None:
+        await _ghl.aclose()
+    conn = getattr(_checkpointer, "conn", None)
+    if conn is not None:
+        await conn.close()
+
+
+def __getattr__(name: str) -> Any:
+    # LangGraph CLI entry (langgraph.json): ./app/graph/compiled.py:graph
+    if name == "graph":
+        return get_graph()
+    raise AttributeError(name)
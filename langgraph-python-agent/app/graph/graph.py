@@ -1,48 +1,77 @@
 from __future__ import annotations
 
+import asyncio
 import os
-from typing import Any
+from typing import Any, Optional, Tuple
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_openai import ChatOpenAI
 
 from app.core.state import State
+from app.core import metrics
+from app.core.tracing import traced
+from app.graph.checkpointer import BoundedMemorySaver
+from app.graph.overload import RULES_CLASSIFY, TEMPLATE_REPLY, overload
+from app.graph.scheduler import scheduler
+from app.graph.serde import StateSerializer
 from app.tools.ghl_client import GhlClient
-from app.nodes import fetch_crm, classify, plan, tag, respond, book
+from app.nodes import fetch_crm, sync_history, classify, plan, tag, respond, book, reengage
+from app.nodes.classify_batch import make_batcher
 
 
-def build_graph() -> Any:
+def make_llms() -> Tuple[Any, Any]:
+    """
+    Return (small, big) chat models, or (None, None) without OPENAI_API_KEY so nodes use
+    their offline fallbacks. Models are configurable via MODEL_CLASSIFY / MODEL_RESPOND.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        return None, None
+    # Deferred: langchain_openai/openai imports dominate cold start
+    from langchain_openai import ChatOpenAI
+
+    model_classify = os.getenv("MODEL_CLASSIFY", "gpt-4o-mini")
+    model_respond = os.getenv("MODEL_RESPOND", "gpt-4o")
+    return (
+        ChatOpenAI(model=model_classify, temperature=0.2),
+        ChatOpenAI(model=model_respond, temperature=0.5),
+    )
+
+
+def build_graph(
+    checkpointer: Any = None,
+    ghl: Any = None,
+    llms: Optional[Tuple[Any, Any]] = None,
+) -> Any:
     """
     Build and compile the LangGraph for the GHL agent.
 
     Returns a compiled graph (callable). Use .invoke / .ainvoke with a State instance and
     config={"configurable": {"thread_id": "<contact_id>"}} to preserve conversation memory.
+    Pass ``checkpointer`` to override the default in-memory saver, ``ghl`` to share a
+    pooled GHL client with the caller and ``llms`` as (small, big) to inject models.
     """
-    # Models (configurable via env)
-    model_classify = os.getenv("MODEL_CLASSIFY", "gpt-4o-mini")
-    model_respond = os.getenv("MODEL_RESPOND", "gpt-4o")
-
-    # Build LLMs only if OPENAI_API_KEY is set; otherwise run with offline fallbacks
-    if os.getenv("OPENAI_API_KEY"):
-        llm_small = ChatOpenAI(model=model_classify, temperature=0.2)
-        llm_big = ChatOpenAI(model=model_respond, temperature=0.5)
-    else:
-        llm_small = None  # type: ignore
-        llm_big = None  # type: ignore
+    llm_small, llm_big = llms if llms is not None else make_llms()
 
     # Tools
-    ghl = GhlClient()
+    ghl = ghl or GhlClient()
 
     # Graph definition
     graph = StateGraph(State)
 
     # Wrap dependency-injected nodes with correct signatures
+    # CRM lookup and conversation-history delta touch different fields; fetch concurrently
     async def node_fetch_crm(state: State) -> State:
-        return await fetch_crm(state, ghl)
+        await asyncio.gather(fetch_crm(state, ghl), sync_history(state, ghl))
+        return state
 
+    # Concurrent classify calls share small-model requests (CLASSIFY_BATCH_WINDOW_MS)
+    batcher = make_batcher(llm_small)
+
+    # Under overload, classify with local rules and reply with templates (llm=None paths)
     async def node_classify(state: State) -> State:
-        return await classify(state, llm_small)
+        if overload.level() >= RULES_CLASSIFY:
+            metrics.incr("overload.rules_classify")
+            return await classify(state, None)
+        return await classify(state, llm_small, batcher)
 
     def node_plan(state: State) -> State:
         return plan(state)
@@ -50,18 +79,26 @@ def build_graph() -> Any:
     async def node_tag(state: State) -> State:
         return await tag(state, ghl)
 
+    # Expensive stages wait for a scheduler slot, ordered by intent and priority
     async def node_respond(state: State) -> State:
-        return await respond(state, llm_big, ghl)
+        llm = llm_big
+        if overload.level() >= TEMPLATE_REPLY:
+            metrics.incr("overload.template_reply")
+            llm = None
+        async with scheduler.slot(state.nlp.intent, state.nlp.priority):
+            return await respond(state, llm, ghl)
 
     async def node_book(state: State) -> State:
-        return await book(state, ghl, llm_big)
+        async with scheduler.slot(state.nlp.intent, state.nlp.priority):
+            return await book(state, ghl, llm_big)
 
-    graph.add_node("fetch_crm", node_fetch_crm)
-    graph.add_node("classify", node_classify)
-    graph.add_node("plan", node_plan)
-    graph.add_node("tag", node_tag)
-    graph.add_node("respond", node_respond)
-    graph.add_node("book", node_book)
+    # Each node is a span of the run's trace (app/core/tracing.py; no-op outside a trace)
+    graph.add_node("fetch_crm", traced("fetch_crm", node_fetch_crm))
+    graph.add_node("classify", traced("classify", node_classify))
+    graph.add_node("plan", traced("plan", node_plan))
+    graph.add_node("tag", traced("tag", node_tag))
+    graph.add_node("respond", traced("respond", node_respond))
+    graph.add_node("book", traced("book", node_book))
 
     graph.add_edge("fetch_crm", "classify")
     graph.add_edge("classify", "plan")
@@ -84,6 +121,42 @@ def build_graph() -> Any:
 
     graph.set_entry_point("fetch_crm")
 
-    # In-memory checkpoint for local dev (Cloud provides persistence)
-    memory = MemorySaver()
-    return graph.compile(checkpointer=memory)
+    # Bounded in-memory checkpoints for local dev and single-node deployments (Cloud and
+    # STORE_BACKEND=sqlite provide persistence)
+    if checkpointer is None:
+        checkpointer = BoundedMemorySaver(serde=StateSerializer())
+    return graph.compile(checkpointer=checkpointer)
+
+
+def build_campaign_graph(ghl: Any = None, llms: Optional[Tuple[Any, Any]] = None) -> Any:
+    """
+    Proactive variant for outbound campaigns (app/campaign): fetch_crm -> reengage -> tag.
+
+    Compiled without a checkpointer: GHL holds the transcript, and the lead's next inbound
+    webhook syncs it into the conversation thread.
+    """
+    llm_small, _llm_big = llms if llms is not None else make_llms()
+    ghl = ghl or GhlClient()
+    graph = StateGraph(State)
+
+    async def node_fetch_crm(state: State) -> State:
+        return await fetch_crm(state, ghl)
+
+    # Short templated outreach; the small model keeps 10k-contact campaigns cheap and fast
+    async def node_reengage(state: State) -> State:
+        llm = llm_small if overload.level() < TEMPLATE_REPLY else None
+        return await reengage(state, llm, ghl)
+
+    async def node_tag(state: State) -> State:
+        return await tag(state, ghl)
+
+    graph.add_node("fetch_crm", traced("fetch_crm", node_fetch_crm))
+    graph.add_node("reengage", traced("reengage", node_reengage))
+    graph.add_node("tag", traced("tag", node_tag))
+    graph.add_edge("fetch_crm", "reengage")
+    graph.add_conditional_edges(
+        "reengage", lambda s: s.planner.next_action, {"tag": "tag", "done": END}
+    )
+    graph.add_edge("tag", END)
+    graph.set_entry_point("fetch_crm")
+    return graph.compile()
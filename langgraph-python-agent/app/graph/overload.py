@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.core import metrics
+from app.graph.scheduler import scheduler
+
+# Degradation levels, entered in order as pressure rises:
+NORMAL = 0
+RULES_CLASSIFY = 1  # classify with the local rules instead of the small model
+TEMPLATE_REPLY = 2  # respond with the offline template replies instead of the big model
+DEFER = 3  # queue non-urgent inbound messages until load drops
+
+LEVEL_NAMES = {NORMAL: "normal", RULES_CLASSIFY: "rules_classify",
+               TEMPLATE_REPLY: "template_reply", DEFER: "defer"}
+
+# Pressure is the worst of in-flight graph runs, scheduler queue depth and recent graph
+# latency, each relative to its limit below (1.0 = at the limit). A limit of 0 ignores
+# that signal; OVERLOAD_INFLIGHT=0 disables the controller.
+OVERLOAD_INFLIGHT = int(os.getenv("OVERLOAD_INFLIGHT", "64"))
+OVERLOAD_QUEUE = int(os.getenv("OVERLOAD_QUEUE", "32"))
+OVERLOAD_LATENCY_MS = float(os.getenv("OVERLOAD_LATENCY_MS", "8000"))
+# Minimum time at a level before stepping back down (one level at a time)
+OVERLOAD_RECOVER_S = float(os.getenv("OVERLOAD_RECOVER_S", "10"))
+
+# Pressure at which each level is entered; a level is left below 80% of its threshold
+_THRESHOLDS = {RULES_CLASSIFY: 1.0, TEMPLATE_REPLY: 1.5, DEFER: 2.0}
+_HYSTERESIS = 0.8
+# Weight of the newest sample in the latency moving average
+_EWMA_ALPHA = 0.2
+
+_URGENT_WORDS = ("book", "agendar", "cita", "call", "llamada", "appointment", "schedule")
+
+
+class OverloadController:
+    """Tracks load signals and picks a degradation level; recovers automatically."""
+
+    def __init__(
+        self,
+        inflight_limit: int = OVERLOAD_INFLIGHT,
+        queue_limit: int = OVERLOAD_QUEUE,
+        latency_limit_ms: float = OVERLOAD_LATENCY_MS,
+        recover_s: float = OVERLOAD_RECOVER_S,
+    ) -> None:
+        self.inflight_limit = inflight_limit
+        self.queue_limit = queue_limit
+        self.latency_limit_ms = latency_limit_ms
+        self.recover_s = recover_s
+        self.inflight = 0
+        self.latency_ms = 0.0
+        self._sampled = time.monotonic()
+        self._level = NORMAL
+        self._since = time.monotonic()
+
+    def pressure(self) -> float:
+        p = 0.0
+        if self.inflight_limit > 0:
+            p = max(p, self.inflight / self.inflight_limit)
+        if self.queue_limit > 0:
+            p = max(p, scheduler.depth / self.queue_limit)
+        if self.latency_limit_ms > 0:
+            # Halve the latency signal every recover_s without new samples, so an idle
+            # process recovers even though no run reports a better latency
+            idle = time.monotonic() - self._sampled
+            latency = self.latency_ms * 0.5 ** (idle / max(self.recover_s, 1e-3))
+            p = max(p, latency / self.latency_limit_ms)
+        return p
+
+    def level(self) -> int:
+        """Current level, re-evaluated from the latest signals."""
+        if self.inflight_limit <= 0:
+            return NORMAL
+        p = self.pressure()
+        target = max((lvl for lvl, t in _THRESHOLDS.items() if p >= t), default=NORMAL)
+        now = time.monotonic()
+        if target > self._level:
+            self._move(target, now)
+        elif (
+            self._level > NORMAL
+            and p < _THRESHOLDS[self._level] * _HYSTERESIS
+            and now - self._since >= self.recover_s
+        ):
+            self._move(self._level - 1, now)
+        metrics.set_gauge("overload.pressure", round(p, 3))
+        return self._level
+
+    def _move(self, level: int, now: float) -> None:
+        metrics.incr(f"overload.transition.{LEVEL_NAMES[self._level]}_to_{LEVEL_NAMES[level]}")
+        metrics.set_gauge("overload.level", level)
+        self._level = level
+        self._since = now
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count a graph run as in flight and feed its latency into the moving average."""
+        self.inflight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            ms = (time.monotonic() - start) * 1000
+            self.latency_ms += _EWMA_ALPHA * (ms - self.latency_ms)
+            self._sampled = time.monotonic()
+            metrics.set_gauge("overload.inflight", self.inflight)
+
+    def should_defer(self, text: Optional[str]) -> bool:
+        """At DEFER level, everything but messages that look like booking requests waits."""
+        if self.level() < DEFER:
+            return False
+        msg = (text or "").lower()
+        return not any(w in msg for w in _URGENT_WORDS)
+
+
+# Process-wide controller shared by the webhook and graph nodes
+overload = OverloadController()
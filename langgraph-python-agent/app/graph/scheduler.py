@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from app.core import metrics
+
+# Expensive stages (respond LLM, booking) run in at most SCHEDULER_SLOTS concurrent slots
+# per process; 0 disables the limit. When saturated, the waiting run with the best rank
+# goes next: booking first, then price, qualify/info, the rest, and higher NLP.priority
+# (5 = most urgent) within an intent. Waiting improves a run's rank by one step every
+# SCHEDULER_AGING_MS, so low-priority messages are delayed but never starved.
+SCHEDULER_SLOTS = int(os.getenv("SCHEDULER_SLOTS", "8"))
+SCHEDULER_AGING_MS = float(os.getenv("SCHEDULER_AGING_MS", "250"))
+
+_INTENT_RANK = {"book": 0, "price": 1, "qualify": 2, "info": 2}
+
+
+def rank(intent: Optional[str], priority: Optional[int]) -> int:
+    """Base rank of a run, lower runs first (0..19)."""
+    prio = max(1, min(5, priority or 3))
+    return _INTENT_RANK.get(intent or "", 3) * 5 + (5 - prio)
+
+
+class _Waiter:
+    __slots__ = ("rank", "since", "seq", "fut")
+
+    def __init__(self, rank: int, since: float, seq: int, fut: "asyncio.Future[None]") -> None:
+        self.rank = rank
+        self.since = since
+        self.seq = seq
+        self.fut = fut
+
+
+class PriorityScheduler:
+    """Priority semaphore with aging for the expensive graph stages."""
+
+    def __init__(self, slots: int = SCHEDULER_SLOTS, aging_ms: float = SCHEDULER_AGING_MS) -> None:
+        self.slots = slots
+        self.aging = max(aging_ms, 1.0) / 1000
+        self.busy = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self, intent: Optional[str], priority: Optional[int]) -> AsyncIterator[None]:
+        if self.slots <= 0:
+            yield
+            return
+        cls = f"{intent or 'none'}.p{priority or 3}"
+        start = time.monotonic()
+        if self.busy < self.slots and not self._waiters:
+            self.busy += 1
+        else:
+            w = _Waiter(rank(intent, priority), start, next(self._seq),
+                        asyncio.get_running_loop().create_future())
+            self._waiters.append(w)
+            metrics.set_gauge("scheduler.queue_depth", len(self._waiters))
+            try:
+                await w.fut
+            except asyncio.CancelledError:
+                if w.fut.done() and not w.fut.cancelled():
+                    self._release()  # slot was handed over just before cancellation
+                elif w in self._waiters:
+                    self._waiters.remove(w)
+                raise
+        wait_ms = (time.monotonic() - start) * 1000
+        metrics.incr(f"scheduler.runs.{cls}")
+        metrics.incr(f"scheduler.wait_ms.{cls}", int(wait_ms))
+        metrics.set_gauge(f"scheduler.last_wait_ms.{cls}", round(wait_ms, 1))
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        # Hand the slot to the best-ranked waiter (rank minus aging credit), FIFO on ties
+        now = time.monotonic()
+        while self._waiters:
+            w = min(self._waiters, key=lambda w: (w.rank - (now - w.since) / self.aging, w.seq))
+            self._waiters.remove(w)
+            if not w.fut.done():
+                w.fut.set_result(None)
+                metrics.set_gauge("scheduler.queue_depth", len(self._waiters))
+                return
+        self.busy -= 1
+        metrics.set_gauge("scheduler.queue_depth", 0)
+
+
+# Process-wide scheduler shared by all graph runs
+scheduler = PriorityScheduler()
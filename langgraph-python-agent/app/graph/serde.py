@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+import ormsgpack
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from pydantic import BaseModel
+
+from app.core import metrics
+from app.core.state import CRM, NLP, Booking, Planner, State, Turn
+
+_msgpack_default: Optional[Callable[[Any], Any]]
+try:
+    # Private helper of langgraph-checkpoint (version pinned in requirements.txt); if a
+    # release drops it, StateSerializer writes plain JsonPlus checkpoints instead
+    from langgraph.checkpoint.serde.jsonplus import _msgpack_default
+except ImportError:  # pragma: no cover - depends on the installed langgraph-checkpoint
+    _msgpack_default = None
+
+# msgpack ext codes for our state models; LangGraph's own codes stay below 16
+EXT_HISTORY = 64
+EXT_TURN = 65
+EXT_MODEL_BASE = 96
+
+# Models stored as (field names, values) in field-declaration order, without module paths.
+# A checkpoint written under other fields (a model changed between releases) is rebuilt
+# by name and validated instead of being mapped by position.
+_MODELS: Tuple[Type[BaseModel], ...] = (CRM, NLP, Planner, Booking, State)
+_MODEL_CODES: Dict[Type[BaseModel], int] = {m: EXT_MODEL_BASE + i for i, m in enumerate(_MODELS)}
+_MODEL_FIELDS: Dict[int, Tuple[str, ...]] = {
+    EXT_MODEL_BASE + i: tuple(m.model_fields) for i, m in enumerate(_MODELS)
+}
+
+# History roles packed one byte per turn
+_ROLE_CODES = {"user": 0, "assistant": 1, "tool": 2}
+_ROLES = ("user", "assistant", "tool")
+
+_OPTION = ormsgpack.OPT_NON_STR_KEYS
+
+
+def _is_history(obj: Any) -> bool:
+    return isinstance(obj, list) and bool(obj) and all(type(t) is Turn for t in obj)
+
+
+def _pack_history(turns: List[Turn]) -> ormsgpack.Ext:
+    roles = bytes(_ROLE_CODES[t.role] for t in turns)
+    return ormsgpack.Ext(EXT_HISTORY, ormsgpack.packb((roles, [t.content for t in turns])))
+
+
+def _default(obj: Any) -> Any:
+    code = _MODEL_CODES.get(type(obj))
+    if code is not None:
+        values = [getattr(obj, f) for f in _MODEL_FIELDS[code]]
+        if type(obj) is State and _is_history(obj.history):
+            values[_MODEL_FIELDS[code].index("history")] = _pack_history(obj.history)
+        return ormsgpack.Ext(code, _pack((_MODEL_FIELDS[code], tuple(values))))
+    if type(obj) is Turn:
+        return ormsgpack.Ext(EXT_TURN, ormsgpack.packb((_ROLE_CODES[obj.role], obj.content)))
+    # Everything else (LangGraph internals, messages, Send, ...) uses the stock encoding
+    assert _msgpack_default is not None  # StateSerializer only packs when it is available
+    return _msgpack_default(obj)
+
+
+def _pack(obj: Any) -> bytes:
+    if _is_history(obj):
+        obj = _pack_history(obj)
+    return ormsgpack.packb(obj, default=_default, option=_OPTION)
+
+
+def _build(code: int, names: Sequence[str], values: Sequence[Any]) -> BaseModel:
+    cls = _MODELS[code - EXT_MODEL_BASE]
+    fields = _MODEL_FIELDS[code]
+    if tuple(names) == fields:
+        # Values were produced from a valid model of this layout; skip re-validation
+        return cls.model_construct(**dict(zip(fields, values)))
+    # Written under another layout: keep fields that still exist, validate, defaults for the rest
+    metrics.incr("checkpoint.layout_mismatch")
+    return cls.model_validate({n: v for n, v in zip(names, values) if n in cls.model_fields})
+
+
+def _make_ext_hook(fallback: Optional[Callable[[int, bytes], Any]]) -> Callable[[int, bytes], Any]:
+    def ext_hook(code: int, data: bytes) -> Any:
+        if code in _MODEL_FIELDS:
+            names, values = ormsgpack.unpackb(data, ext_hook=ext_hook, option=_OPTION)
+            return _build(code, names, values)
+        if code == EXT_HISTORY:
+            roles, contents = ormsgpack.unpackb(data)
+            return [
+                Turn.model_construct(role=_ROLES[r], content=c) for r, c in zip(roles, contents)
+            ]
+        if code == EXT_TURN:
+            role, content = ormsgpack.unpackb(data)
+            return Turn.model_construct(role=_ROLES[role], content=content)
+        if fallback is None:
+            raise ValueError(f"unknown msgpack ext code {code}")
+        return fallback(code, data)
+
+    return ext_hook
+
+
+class StateSerializer(JsonPlusSerializer):
+    """
+    Checkpoint serializer with a compact binary layout for the agent's State models.
+
+    State sub-models are packed as ``(field names, values)`` pairs keyed by a one-byte ext
+    code instead of ``(module, class, field dict)`` triples, so a model whose fields changed
+    between releases is rebuilt by name; history is stored column-wise
+    (a role byte array plus a list of contents). Other values fall back to JsonPlusSerializer,
+    and so does everything when the installed langgraph-checkpoint lacks the private msgpack
+    helpers this builds on.
+    """
+
+    type_name = "state-msgpack"
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        fallback = getattr(self, "_unpack_ext_hook", None)
+        self._compact = _msgpack_default is not None and callable(fallback)
+        self._state_ext_hook = _make_ext_hook(fallback if callable(fallback) else None)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if not self._compact or obj is None or isinstance(obj, (bytes, bytearray)):
+            return super().dumps_typed(obj)
+        try:
+            return self.type_name, _pack(obj)
+        except ormsgpack.MsgpackEncodeError:
+            return super().dumps_typed(obj)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        if data[0] == self.type_name:
+            return ormsgpack.unpackb(data[1], ext_hook=self._state_ext_hook, option=_OPTION)
+        return super().loads_typed(data)
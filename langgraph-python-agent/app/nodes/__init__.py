@@ -1,22 +1,26 @@
 """Agent node implementations grouped by concern.
 
 This package re-exports node callables for convenient imports:
-    from app.nodes import fetch_crm, classify, plan, tag, respond, book
+    from app.nodes import fetch_crm, sync_history, classify, plan, tag, respond, book, reengage
 """
 
 from .fetch_crm import fetch_crm
+from .sync_history import sync_history
 from .classify import classify
 from .plan import plan
 from .tag import tag
 from .respond import respond
 from .book import book
+from .reengage import reengage
 
 __all__ = [
     "fetch_crm",
+    "sync_history",
     "classify",
     "plan",
     "tag",
     "respond",
     "book",
+    "reengage",
 ]
 
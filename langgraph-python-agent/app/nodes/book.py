@@ -4,8 +4,13 @@ from datetime import datetime, timedelta, timezone
 import os
 from typing import Any
 
+from app.core import metrics
 from app.core.state import State
-from app.tools.ghl_client import GhlClient
+from app.tools.ghl_client import GhlClient, GhlError
+from app.tools.reservations import ledger
+
+# Hourly slots tried when earlier ones are held or booked by other leads
+BOOKING_CANDIDATES = int(os.getenv("BOOKING_CANDIDATES", "4"))
 
 
 async def book(state: State, ghl: GhlClient, llm: Any) -> State:
@@ -21,35 +26,79 @@ async def book(state: State, ghl: GhlClient, llm: Any) -> State:
     except Exception:
         cal_id = None
 
-    # Simple slot: tomorrow at 3pm UTC (placeholder; replace with TZ-aware logic)
+    # Simple slots: tomorrow from 3pm UTC, hourly (placeholder; replace with TZ-aware logic)
     tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
-    slot = tomorrow.replace(hour=15, minute=0, second=0, microsecond=0).isoformat()
+    first = tomorrow.replace(hour=15, minute=0, second=0, microsecond=0)
+    candidates = [first + timedelta(hours=h) for h in range(max(1, BOOKING_CANDIDATES))]
+    start = candidates[0]
 
     appt_id = None
     if cal_id:
-        try:
-            appt = await ghl.create_appointment(str(cal_id), state.contact_id, slot)
-            appt_id = appt.get("id") if isinstance(appt, dict) else None
-        except Exception:
-            appt_id = None
+        # A lead repeating "yes" gets its existing appointment back, whichever candidate it
+        # was booked on (an earlier slot may have been freed since)
+        slots = [c.isoformat() for c in candidates]
+        mine = await ledger.booked_by(str(cal_id), slots, state.contact_id)
+        if mine is not None:
+            start = datetime.fromisoformat(mine[0])
+            appt_id = mine[1]
+            metrics.incr("booking.slot_reused")
+    if cal_id and appt_id is None:
+        # Reserve locally before the GHL round-trip: slots held or booked by another lead
+        # are skipped, and so are slots GHL rejects
+        tried = None
+        for candidate in candidates:
+            slot_iso = candidate.isoformat()
+            claim, existing = await ledger.claim(str(cal_id), slot_iso, state.contact_id)
+            if claim == "taken":
+                continue
+            tried = tried or candidate
+            if claim == "mine":
+                start, appt_id = candidate, existing
+                break
+            try:
+                appt = await ghl.create_appointment(str(cal_id), state.contact_id, slot_iso)
+                appt_id = appt.get("id") if isinstance(appt, dict) else None
+            except GhlError as e:
+                await ledger.release(str(cal_id), slot_iso, state.contact_id)
+                if e.status_code is not None and 400 <= e.status_code < 500:
+                    metrics.incr("booking.slot_rejected")
+                    continue  # slot not available in GHL; try the next one
+                break
+            except Exception:
+                await ledger.release(str(cal_id), slot_iso, state.contact_id)
+                break
+            if appt_id:
+                start = candidate
+                await ledger.confirm(
+                    str(cal_id), slot_iso, state.contact_id, appt_id, candidate.timestamp()
+                )
+                break
+            await ledger.release(str(cal_id), slot_iso, state.contact_id)
+        if appt_id is None and tried is not None:
+            start = tried
 
+    slot = start.isoformat()
+    hour = start.strftime("%I:%M %p").lstrip("0").lower()
     state.booking.selected_slot = slot
     state.booking.appointment_id = appt_id
 
     if state.nlp.language == "es":
         msg = (
-            "Puedo agendar una llamada. Propongo mañana a las 3:00 pm. "
+            f"Puedo agendar una llamada. Propongo mañana a las {hour}. "
             "Si no te funciona, dime un horario alternativo y lo ajustamos."
         )
         if appt_id:
-            msg = f"Listo, agendé una llamada para mañana a las 3:00 pm (ID {appt_id}). ¿Te funciona?"
+            msg = (
+                f"Listo, agendé una llamada para mañana a las {hour} (ID {appt_id}). "
+                "¿Te funciona?"
+            )
     else:
         msg = (
-            "I can schedule a quick call. I propose tomorrow at 3:00 pm. "
+            f"I can schedule a quick call. I propose tomorrow at {hour}. "
             "If that doesn't work, share a time and I'll adjust."
         )
         if appt_id:
-            msg = f"Booked a call for tomorrow at 3:00 pm (ID {appt_id}). Does that work?"
+            msg = f"Booked a call for tomorrow at {hour} (ID {appt_id}). Does that work?"
 
     try:
         await ghl.send_message(state.contact_id, msg, state.channel or "sms")
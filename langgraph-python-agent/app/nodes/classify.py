@@ -1,52 +1,81 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, Dict, Optional, Tuple
 
 from langchain_core.messages import HumanMessage
 
 from app.core.state import State
 from ._utils import to_text, parse_json
 
+INTENTS = {"qualify", "price", "book", "info", "out_of_scope"}
 
-async def classify(state: State, llm: Any) -> State:
-    """Classify language, intent, priority, sentiment using a small model with JSON output."""
+# Shared by single and batched requests (app/nodes/classify_batch.py)
+INSTRUCTIONS = (
+    'keys: "language" (one of "es"|"en"), '
+    '"intent" (one of "qualify"|"price"|"book"|"info"|"out_of_scope"), '
+    '"priority" (1-5, 5 = most urgent), "sentiment" ("pos"|"neu"|"neg"). No extra text.'
+)
+
+
+class BatchFailed(Exception):
+    """The shared classify request failed as a whole (after its retry)."""
+
+
+def _fallback(state: State, book_words: Tuple[str, ...] = ("book", "agendar")) -> None:
+    msg = (state.latest_text or "").lower()
+    state.nlp.language = "es" if any(x in msg for x in ["hola", "precio", "agendar"]) else "en"
+    state.nlp.intent = "book" if any(w in msg for w in book_words) else "qualify"
+    state.nlp.priority = 3
+    state.nlp.sentiment = "neu"
+
+
+def apply_labels(state: State, data: Any) -> None:
+    """Copy a classifier label set onto state.nlp, normalizing values; heuristics if unusable."""
+    if not isinstance(data, dict):
+        _fallback(state, book_words=("book",))
+        return
+    lang = str(data.get("language", "")).lower()
+    state.nlp.language = "es" if lang.startswith("es") else "en"
+    intent = str(data.get("intent", "")).lower()
+    state.nlp.intent = intent if intent in INTENTS else "qualify"  # type: ignore
+    try:
+        prio = int(data.get("priority", 3))
+        state.nlp.priority = max(1, min(5, prio))
+    except Exception:
+        state.nlp.priority = 3
+    sent = str(data.get("sentiment", "neu")).lower()
+    state.nlp.sentiment = (
+        "pos" if sent.startswith("p") else ("neg" if sent.startswith("n") else "neu")
+    )
+
+
+async def classify(state: State, llm: Any, batcher: Optional[Any] = None) -> State:
+    """
+    Classify language, intent, priority, sentiment using a small model with JSON output.
+
+    With a ``batcher`` (ClassifyBatcher), concurrent calls share one model request; a message
+    the batch could not label is classified on its own. If the whole batch failed, heuristics
+    label it instead, so an outage doesn't turn one failed request into one per message.
+    """
     # Offline fallback if no LLM configured
     if llm is None:
-        msg = (state.latest_text or "").lower()
-        state.nlp.language = "es" if any(x in msg for x in ["hola", "precio", "agendar"]) else "en"
-        state.nlp.intent = "book" if ("book" in msg or "agendar" in msg) else "qualify"
-        state.nlp.priority = 3
-        state.nlp.sentiment = "neu"
+        _fallback(state)
         return state
-    prompt = (
-        "You are a classifier. Read the user's last message and return ONLY a compact JSON object "
-        'with keys: "language" (one of "es"|"en"), "intent" (one of "qualify"|"price"|"book"|"info"|"out_of_scope"), '
-        '"priority" (1-5), "sentiment" ("pos"|"neu"|"neg"). No extra text.\n\n'
-        f'last_message: "{state.latest_text or ""}"'
-    )
-    res = await llm.ainvoke([HumanMessage(content=prompt)])
-    content_text = to_text(res.content)
-    data = parse_json(content_text)
-    if isinstance(data, dict):
-        lang = str(data.get("language", "")).lower()
-        state.nlp.language = "es" if lang.startswith("es") else "en"
-        intent = str(data.get("intent", "")).lower()
-        if intent in {"qualify", "price", "book", "info", "out_of_scope"}:
-            state.nlp.intent = intent  # type: ignore
-        else:
-            state.nlp.intent = "qualify"
+    data: Optional[Dict[str, Any]] = None
+    if batcher is not None:
         try:
-            prio = int(data.get("priority", 3))
-            state.nlp.priority = max(1, min(5, prio))
-        except Exception:
-            state.nlp.priority = 3
-        sent = str(data.get("sentiment", "neu")).lower()
-        state.nlp.sentiment = "pos" if sent.startswith("p") else ("neg" if sent.startswith("n") else "neu")
-    else:
-        # fallback defaults
-        state.nlp.language = "es" if any(x in (state.latest_text or "").lower() for x in ["hola", "precio", "agendar"]) else "en"
-        state.nlp.intent = "book" if "book" in (state.latest_text or "").lower() else "qualify"
-        state.nlp.priority = 3
-        state.nlp.sentiment = "neu"
+            data = await batcher.label(state.latest_text or "")
+        except BatchFailed:
+            _fallback(state)
+            return state
+    if data is None:
+        prompt = (
+            "You are a classifier. Read the user's last message and return ONLY a compact "
+            "JSON object "
+            f"with {INSTRUCTIONS}\n\n"
+            f'last_message: "{state.latest_text or ""}"'
+        )
+        res = await llm.ainvoke([HumanMessage(content=prompt)])
+        data = parse_json(to_text(res.content))
+    apply_labels(state, data)
     return state
-
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import json
+import os
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import HumanMessage
+
+from app.core import metrics
+from app.replay import recorder
+
+from ._utils import parse_json, to_text
+from .classify import INSTRUCTIONS, BatchFailed
+
+# Messages arriving within CLASSIFY_BATCH_WINDOW_MS of the first queued one share a single
+# small-model request (up to CLASSIFY_BATCH_MAX). A window of 0 disables batching.
+BATCH_WINDOW_MS = float(os.getenv("CLASSIFY_BATCH_WINDOW_MS", "20"))
+BATCH_MAX = int(os.getenv("CLASSIFY_BATCH_MAX", "16"))
+# A batch request that fails as a whole is retried once after about this long (jittered);
+# if the retry fails too, its callers fall back to heuristic labels
+BATCH_RETRY_MS = float(os.getenv("CLASSIFY_BATCH_RETRY_MS", "250"))
+
+_Waiter = Tuple[str, "asyncio.Future[Optional[Dict[str, Any]]]"]
+
+
+class ClassifyBatcher:
+    """Collects concurrent classify calls and labels them with one structured request."""
+
+    def __init__(self, llm: Any, window_ms: float = BATCH_WINDOW_MS, max_batch: int = BATCH_MAX,
+                 retry_ms: float = BATCH_RETRY_MS) -> None:
+        self.llm = llm
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.retry = retry_ms / 1000
+        self._pending: List[_Waiter] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def label(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Label set for ``text``, or None if the batch left it out; raises BatchFailed when the
+        batch request itself failed.
+        """
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[Optional[Dict[str, Any]]] = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            # The batch is shared, so it runs outside any one request's context (recording,
+            # tracing); each caller notes its own labels below
+            self._timer = loop.call_later(self.window, self._flush, context=contextvars.Context())
+        data = await fut
+        if data is not None:
+            recorder.note_llm(json.dumps(data))
+        return data
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(
+                self._run(batch), context=contextvars.Context()
+            )
+
+    async def _run(self, batch: List[_Waiter]) -> None:
+        metrics.incr("classify.batches")
+        metrics.incr("classify.batched_messages", len(batch))
+        metrics.set_gauge("classify.last_batch_size", len(batch))
+        results: Dict[int, Dict[str, Any]] = {}
+        messages = json.dumps([{"i": i, "text": t} for i, (t, _) in enumerate(batch)],
+                              ensure_ascii=False)
+        prompt = (
+            "You are a classifier. For each message below return one label object with "
+            f'"i" (the message index) and {INSTRUCTIONS}\n'
+            'Return ONLY a compact JSON object {"results": [...]} with one entry per message.\n\n'
+            f"messages: {messages}"
+        )
+        for attempt in range(2):
+            try:
+                res = await self.llm.ainvoke([HumanMessage(content=prompt)])
+                break
+            except Exception:
+                metrics.incr("classify.batch_errors")
+                if attempt == 0:
+                    await asyncio.sleep(self.retry * random.uniform(0.5, 1.5))
+        else:
+            metrics.incr("classify.batch_failed", len(batch))
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(BatchFailed())
+            return
+        try:
+            data = parse_json(to_text(res.content))
+            items = data.get("results") if isinstance(data, dict) else None
+            for item in items if isinstance(items, list) else []:
+                if isinstance(item, dict) and isinstance(item.get("i"), int):
+                    results[item["i"]] = item
+        except Exception:
+            # Unparseable answer: its messages count as misses and are classified on their own
+            metrics.incr("classify.batch_errors")
+        for i, (_, fut) in enumerate(batch):
+            if not fut.done():
+                fut.set_result(results.get(i))
+        missing = len(batch) - sum(1 for i in range(len(batch)) if i in results)
+        if missing:
+            metrics.incr("classify.batch_misses", missing)
+
+
+def make_batcher(llm: Any) -> Optional[ClassifyBatcher]:
+    """Batcher for ``llm``, or None when there is no model or batching is disabled."""
+    window = float(os.getenv("CLASSIFY_BATCH_WINDOW_MS", str(BATCH_WINDOW_MS)))
+    if llm is None or window <= 0:
+        return None
+    return ClassifyBatcher(llm, window_ms=window)
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
-import os
 from typing import Any
 
 from app.core.state import State
+from app.tools import tenants
 from app.tools.ghl_client import GhlClient
 
 
 async def fetch_crm(state: State, ghl: GhlClient) -> State:
     """Fetch contact + tags; keep minimal facts in state."""
     try:
-        contact = await ghl.get_contact(state.contact_id)
+        contacts = tenants.current().contacts
+        contact = await contacts.aget(state.contact_id)
+        if contact is None:
+            contact = await ghl.get_contact(state.contact_id)
+            await contacts.aset(state.contact_id, contact)
         if contact:
             # Tags shape can vary; normalize to names if present
             tags = []
@@ -20,9 +24,9 @@ async def fetch_crm(state: State, ghl: GhlClient) -> State:
                 elif isinstance(t, str):
                     tags.append(t)
             state.crm.tags = tags or state.crm.tags
-            # Location is commonly set by env; leave as-is if set
+            # Location of the webhook's tenant (or GHL_LOCATION_ID); leave as-is if set
             if not state.crm.location_id:
-                state.crm.location_id = os.getenv("GHL_LOCATION_ID")
+                state.crm.location_id = tenants.current().location_id
     except Exception:
         # Non-fatal; continue without CRM enrichment
         pass
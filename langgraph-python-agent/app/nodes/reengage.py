@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Literal
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from app.core.state import State, Turn
+from app.tools import tenants
+from app.tools.ghl_client import GhlClient
+
+from ._utils import to_text
+
+# Contacts carrying any of these tags (case-insensitive) or GHL's dnd flag are never messaged
+CAMPAIGN_SKIP_TAGS = {
+    t.strip().lower()
+    for t in os.getenv("CAMPAIGN_SKIP_TAGS", "dnd,do not contact,customer").split(",")
+    if t.strip()
+}
+
+
+def campaign_tag(name: str) -> str:
+    """Tag applied to contacts a campaign has messaged; they are skipped on later passes."""
+    return f"campaign:{name}"
+
+
+async def reengage(state: State, llm: Any, ghl: GhlClient) -> State:
+    """
+    Send a proactive re-engagement message to a stale lead (campaign graph). The campaign
+    is described by state.meta: "campaign" (name) and an optional "message" template with
+    {first_name}; without one the model drafts the message (offline templates without a model).
+    """
+    name = state.meta.get("campaign") or "reengage"
+    tags = {t.lower() for t in state.crm.tags}
+    contact = await tenants.current().contacts.aget(state.contact_id) or {}
+    if campaign_tag(name).lower() in tags or tags & CAMPAIGN_SKIP_TAGS or contact.get("dnd"):
+        state.meta["campaign_result"] = "skipped"
+        state.planner.next_action = "done"
+        return state
+
+    language: Literal["es", "en"] = (
+        "es" if "spanish" in tags or state.meta.get("language") == "es" else "en"
+    )
+    state.nlp.language = language
+    first_name = str(contact.get("firstName") or "").strip()
+    template = state.meta.get("message")
+    if template:
+        fallback_name = "amigo" if language == "es" else "there"
+        text = str(template).replace("{first_name}", first_name or fallback_name)
+    elif llm is not None:
+        if language == "es":
+            sys = "Eres un asistente de agencia. Sé breve, cercano y sin presión."
+            user = (f"Nombre del cliente: {first_name or 'desconocido'}\n"
+                    "Escribe un SMS corto en español para retomar el contacto con un cliente "
+                    "potencial que no ha respondido en un tiempo. Ofrece agendar una llamada "
+                    "breve.")
+        else:
+            sys = "You are an agency assistant. Be brief, warm and low-pressure."
+            user = (f"Lead's first name: {first_name or 'unknown'}\n"
+                    "Write a short SMS in English to re-engage a lead who has gone quiet. "
+                    "Offer to book a quick call.")
+        res = await llm.ainvoke([SystemMessage(content=sys), HumanMessage(content=user)])
+        text = to_text(res.content)
+    elif language == "es":
+        text = (f"¡Hola{' ' + first_name if first_name else ''}! Hace tiempo que no hablamos. "
+                "¿Sigues buscando más ventas o clientes? Puedo agendarte una llamada breve "
+                "esta semana.")
+    else:
+        text = (f"Hi{' ' + first_name if first_name else ''}! It's been a while. Are you still "
+                "looking to grow sales or leads? Happy to book a quick call this week.")
+
+    try:
+        await ghl.send_message(state.contact_id, text, state.channel or "sms")
+    except Exception:
+        state.meta["campaign_result"] = "failed"
+        state.planner.next_action = "done"
+        return state
+    state.history.append(Turn(role="assistant", content=text))
+    # tag() assigns these (plus the language tag) to the contact
+    state.crm.tags = sorted(set(state.crm.tags) | {campaign_tag(name)})
+    state.meta["campaign_result"] = "sent"
+    state.planner.next_action = "tag"
+    return state
@@ -1,14 +1,33 @@
 from __future__ import annotations
 
-from typing import Any
+import os
+from typing import Any, List
 
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 
-from app.core.state import State
+from app.core.state import State, Turn
 from app.tools.ghl_client import GhlClient
 from ._utils import to_text
 
 
+# Prior conversation turns given to the model (synced from GHL by sync_history)
+RESPOND_HISTORY_TURNS = int(os.getenv("RESPOND_HISTORY_TURNS", "12"))
+
+
+def _context(state: State) -> List[BaseMessage]:
+    turns = state.history
+    # The synced transcript already ends with the message being answered
+    if turns and turns[-1].role == "user" and turns[-1].content == state.latest_text:
+        turns = turns[:-1]
+    out: List[BaseMessage] = []
+    for t in turns[-RESPOND_HISTORY_TURNS:] if RESPOND_HISTORY_TURNS > 0 else []:
+        if t.role == "user":
+            out.append(HumanMessage(content=t.content))
+        elif t.role == "assistant":
+            out.append(AIMessage(content=t.content))
+    return out
+
+
 async def respond(state: State, llm: Any, ghl: GhlClient) -> State:
     """Draft a bilingual response and send via GHL."""
     # Offline fallback if no LLM configured
@@ -23,7 +42,7 @@ async def respond(state: State, llm: Any, ghl: GhlClient) -> State:
             await ghl.send_message(state.contact_id, text, state.channel or "sms")
         except Exception:
             pass
-        state.history.append({"role": "assistant", "content": text})  # type: ignore
+        state.history.append(Turn(role="assistant", content=text))
         state.planner.next_action = "done"
         return state
     if state.nlp.language == "es":
@@ -40,13 +59,14 @@ async def respond(state: State, llm: Any, ghl: GhlClient) -> State:
             "Write a brief, empathetic reply in English. Ask their main goal (sales, leads, or launch), "
             "offer to book a quick call, and ask if they have a monthly budget or prefer a suggestion."
         )
-    res = await llm.ainvoke([SystemMessage(content=sys), HumanMessage(content=user)])
+    messages = [SystemMessage(content=sys), *_context(state), HumanMessage(content=user)]
+    res = await llm.ainvoke(messages)
     text = to_text(res.content)
     try:
         await ghl.send_message(state.contact_id, text, state.channel or "sms")
     except Exception:
         pass
-    state.history.append({"role": "assistant", "content": text})  # type: ignore
+    state.history.append(Turn(role="assistant", content=text))
     state.planner.next_action = "done"
     return state
 
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.state import State, Turn
+from app.tools import tenants
+from app.tools.ghl_client import GhlClient
+
+# Messages kept per conversation (oldest dropped first)
+HISTORY_MAX = int(os.getenv("HISTORY_MAX", "50"))
+# Page size of the per-turn delta fetch; a conversation that moved further than this since
+# the last sync pages back (up to HISTORY_SYNC_MAX_PAGES)
+HISTORY_DELTA_LIMIT = int(os.getenv("HISTORY_DELTA_LIMIT", "10"))
+HISTORY_SYNC_MAX_PAGES = int(os.getenv("HISTORY_SYNC_MAX_PAGES", "5"))
+
+# (GHL message id, role, text)
+_Message = Tuple[str, str, str]
+
+
+def _page(resp: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool, Optional[str]]:
+    # {"messages": {"messages": [...], "nextPage": bool, "lastMessageId": "..."}}
+    body = resp.get("messages") if isinstance(resp, dict) else None
+    if isinstance(body, list):
+        return body, False, None
+    if not isinstance(body, dict):
+        return [], False, None
+    items = body.get("messages")
+    messages = items if isinstance(items, list) else []
+    return messages, bool(body.get("nextPage")), body.get("lastMessageId")
+
+
+def _to_message(m: Dict[str, Any]) -> Optional[_Message]:
+    text = m.get("body")
+    if not m.get("id") or not isinstance(text, str) or not text.strip():
+        return None  # activity entries, calls, attachments without text
+    role = "user" if m.get("direction") == "inbound" else "assistant"
+    return str(m["id"]), role, text
+
+
+async def _fetch_delta(
+    ghl: GhlClient, conversation_id: str, cursor: Optional[str]
+) -> List[_Message]:
+    """GHL messages newer than ``cursor`` (recent ones up to HISTORY_MAX if None), oldest first."""
+    limit = HISTORY_DELTA_LIMIT if cursor else min(HISTORY_MAX, 100)
+    new: List[_Message] = []
+    last_id: Optional[str] = None
+    for _ in range(HISTORY_SYNC_MAX_PAGES):
+        items, next_page, last_id = _page(
+            await ghl.get_messages(conversation_id, limit=limit, last_message_id=last_id)
+        )
+        metrics.incr("history.fetches")
+        for m in items:
+            if cursor and m.get("id") == cursor:
+                return new[::-1]
+            msg = _to_message(m)
+            if msg is not None:
+                new.append(msg)
+        if not next_page or not last_id or len(new) >= HISTORY_MAX:
+            break
+    return new[::-1]
+
+
+async def sync_history(state: State, ghl: GhlClient) -> State:
+    """
+    Bring state.history in line with the GHL conversation (human agents' messages, messages
+    from before the bot was enabled) at the cost of one small delta fetch per turn.
+    """
+    if not state.conversation_id:
+        return _append_inbound(state)
+    try:
+        # Cached per conversation: {"cursor": newest GHL message id, "messages": [[id, role, text]]}
+        cache = tenants.current().conversations
+        entry = await cache.aget(state.conversation_id) or {}
+        messages: List[List[str]] = entry.get("messages") or []
+        delta = await _fetch_delta(ghl, state.conversation_id, entry.get("cursor"))
+        if delta:
+            seen = {m[0] for m in messages}
+            messages = (messages + [list(m) for m in delta if m[0] not in seen])[-HISTORY_MAX:]
+            entry = {"cursor": messages[-1][0], "messages": messages}
+            await cache.aset(state.conversation_id, entry)
+            metrics.incr("history.synced_messages", len(delta))
+        if messages:
+            # GHL is the transcript of record (it includes the bot's own sends), so it replaces
+            # the checkpointed turns instead of being appended to them
+            state.history = [Turn(role=role, content=text) for _id, role, text in messages]  # type: ignore[arg-type]
+            return state
+    except Exception:
+        # Non-fatal; continue with the checkpointed history
+        metrics.incr("history.sync_errors")
+    return _append_inbound(state)
+
+
+def _append_inbound(state: State) -> State:
+    """Without a GHL transcript, the checkpointed history gets the inbound message (capped)."""
+    if state.latest_text:
+        state.history.append(Turn(role="user", content=state.latest_text))
+    del state.history[:-HISTORY_MAX]
+    return state
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from app.core.state import State
+from app.tools import tenants
 from app.tools.ghl_client import GhlClient
 
 
@@ -14,6 +15,7 @@ async def tag(state: State, ghl: GhlClient) -> State:
     try:
         await ghl.assign_tags(state.contact_id, sorted(list(tags)))
         state.crm.tags = sorted(list(tags))
+        await tenants.current().contacts.apop(state.contact_id)
     except Exception:
         pass
     state.planner.next_action = "done"
@@ -0,0 +1 @@
+"""Record production webhook traffic into cassettes and replay it offline."""
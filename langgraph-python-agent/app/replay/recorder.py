@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import atexit
+import gzip
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
+
+from app.core import metrics
+
+# Recording is enabled by RECORD_DIR; RECORD_SAMPLE (0..1) records a fraction of requests.
+# Each process appends gzip-compressed JSON lines to RECORD_DIR/cassette-<pid>.jsonl.gz:
+#   {"t": epoch, "ms": latency, "body": raw webhook, "ghl": [[method, args, result]],
+#    "llm": [completion text], "result": handler response}
+# Finished entries are written by a background thread; when more than RECORD_QUEUE_MAX are
+# waiting, new ones are dropped (replay.dropped) rather than delaying requests.
+RECORD_QUEUE_MAX = int(os.getenv("RECORD_QUEUE_MAX", "1000"))
+
+_current: ContextVar[Optional[Dict[str, Any]]] = ContextVar("replay_recording", default=None)
+_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=RECORD_QUEUE_MAX)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def enabled() -> bool:
+    return bool(os.getenv("RECORD_DIR"))
+
+
+def _sampled() -> bool:
+    return random.random() < float(os.getenv("RECORD_SAMPLE", "1"))
+
+
+def _write(entry: Dict[str, Any]) -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_drain, name="replay-recorder", daemon=True)
+            _writer.start()
+            atexit.register(_stop)
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        metrics.incr("replay.dropped")
+
+
+def _drain() -> None:
+    directory = os.environ["RECORD_DIR"]
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"cassette-{os.getpid()}.jsonl.gz")
+    with gzip.open(path, "ab") as f:
+        while True:
+            entry = _queue.get()
+            if entry is None:
+                return
+            f.write(orjson.dumps(entry) + b"\n")
+            if _queue.empty():
+                f.flush()  # flush once per burst, not per entry
+
+
+def _stop() -> None:
+    """Write out queued entries at interpreter exit."""
+    if _writer is not None:
+        try:
+            _queue.put(None, timeout=5.0)
+        except queue.Full:
+            return
+        _writer.join(timeout=5.0)
+
+
+@contextmanager
+def recording(body: bytes) -> Iterator[Dict[str, Any]]:
+    """Capture one webhook request; GHL and LLM calls made inside are attached to it."""
+    if not enabled() or not _sampled():
+        yield {}
+        return
+    entry: Dict[str, Any] = {"t": time.time(), "body": body.decode("utf-8", "replace"),
+                             "ghl": [], "llm": []}
+    token = _current.set(entry)
+    start = time.perf_counter()
+    try:
+        yield entry
+    except BaseException as e:
+        entry["error"] = repr(e)
+        raise
+    finally:
+        _current.reset(token)
+        entry["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _write(entry)
+
+
+def note_ghl(method: str, args: List[Any], result: Any) -> None:
+    entry = _current.get()
+    if entry is not None:
+        entry["ghl"].append([method, args, result])
+
+
+def note_llm(text: str) -> None:
+    entry = _current.get()
+    if entry is not None:
+        entry["llm"].append(text)
+
+
+class RecordingGhl:
+    """Proxy around GhlClient that attaches every API result (or error) to the recording."""
+
+    def __init__(self, inner: Any) -> None:
+        self._inner = inner
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._inner, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            try:
+                result = await attr(*args, **kwargs)
+            except Exception as e:
+                note_ghl(name, list(args), {"__error__": str(e)})
+                raise
+            note_ghl(name, list(args), result)
+            return result
+
+        return call
+
+
+class RecordingLLM:
+    """Proxy around a chat model that records each completion's text."""
+
+    def __init__(self, inner: Any) -> None:
+        self._inner = inner
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        from app.nodes._utils import to_text
+
+        res = await self._inner.ainvoke(*args, **kwargs)
+        note_llm(to_text(res.content))
+        return res
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._inner, name)
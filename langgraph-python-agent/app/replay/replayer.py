@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import glob
+import gzip
+import os
+import time
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import orjson
+
+from app.tools.ghl_client import GhlError
+
+# Fields of the handler response that encode routing decisions
+DECISION_KEYS = ("status", "next_action", "intent", "language")
+
+
+def load_cassettes(paths: List[str]) -> List[Dict[str, Any]]:
+    """Read entries from cassette files or directories, ordered by arrival time."""
+    files: List[str] = []
+    for p in paths:
+        files.extend(sorted(glob.glob(os.path.join(p, "*.jsonl*"))) if os.path.isdir(p) else [p])
+    entries: List[Dict[str, Any]] = []
+    for f in files:
+        opener = gzip.open if f.endswith(".gz") else open
+        with opener(f, "rb") as fh:
+            try:
+                for line in fh:
+                    if line.strip():
+                        entries.append(orjson.loads(line))
+            except EOFError:
+                pass  # cassette still being written; keep what was flushed
+    entries.sort(key=lambda e: e.get("t", 0))
+    return entries
+
+
+class _Tape:
+    """Recorded GHL results (per method, in call order) and LLM completions for one entry."""
+
+    def __init__(self, entry: Dict[str, Any]) -> None:
+        self.ghl: Dict[str, Deque[Any]] = defaultdict(deque)
+        for method, _args, result in entry.get("ghl", []):
+            self.ghl[method].append(result)
+        self.llm: Deque[str] = deque(entry.get("llm", []))
+        self.misses = 0
+
+
+_tape: ContextVar[Optional[_Tape]] = ContextVar("replay_tape", default=None)
+
+
+class ReplayGhl:
+    """Stands in for GhlClient, answering each call from the current entry's tape."""
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            tape = _tape.get()
+            queue = tape.ghl.get(name) if tape else None
+            if not queue:
+                # Call not made in production (e.g. cache state differs); behave like a miss
+                if tape:
+                    tape.misses += 1
+                return {}
+            result = queue.popleft()
+            if isinstance(result, dict) and "__error__" in result:
+                raise GhlError(result["__error__"])
+            return result
+
+        return call
+
+
+class ReplayLLM:
+    """Stands in for a chat model, returning recorded completions in order."""
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        from langchain_core.messages import AIMessage
+
+        tape = _tape.get()
+        if tape is None or not tape.llm:
+            if tape:
+                tape.misses += 1
+            return AIMessage(content="")
+        return AIMessage(content=tape.llm.popleft())
+
+
+def _decision(result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: (result or {}).get(k) for k in DECISION_KEYS}
+
+
+def _key(i: int, entry: Dict[str, Any]) -> str:
+    return f"{i}:{entry.get('t', 0)}"
+
+
+async def replay(
+    entries: List[Dict[str, Any]],
+    speed: float = 0.0,
+    concurrency: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Run entries through the webhook path against a fresh offline graph.
+
+    ``speed`` > 0 keeps recorded inter-arrival gaps divided by ``speed`` (e.g. 50 = 50x);
+    0 replays as fast as ``concurrency`` allows. Returns one result row per entry.
+    """
+    from langgraph.checkpoint.memory import MemorySaver
+
+    from app.graph.graph import build_graph
+    from app.graph.serde import StateSerializer
+    from app.web.schema import GhlWebhook
+    from app.web.webhook import process_webhook
+
+    uses_llm = any(e.get("llm") for e in entries)
+    llm = ReplayLLM() if uses_llm else None
+    graph = build_graph(
+        checkpointer=MemorySaver(serde=StateSerializer()), ghl=ReplayGhl(), llms=(llm, llm)
+    )
+    sem = asyncio.Semaphore(max(1, concurrency))
+    t0 = entries[0].get("t", 0) if entries else 0
+    start = time.perf_counter()
+
+    async def run_one(i: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        if speed > 0:
+            delay = (entry.get("t", 0) - t0) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with sem:
+            tape = _Tape(entry)
+            token = _tape.set(tape)
+            began = time.perf_counter()
+            try:
+                hook = GhlWebhook.model_validate_json(entry["body"])
+                result: Optional[Dict[str, Any]] = await process_webhook(hook, graph=graph)
+                error = None
+            except Exception as e:
+                result, error = None, repr(e)
+            finally:
+                _tape.reset(token)
+            return {
+                "key": _key(i, entry),
+                "ms": (time.perf_counter() - began) * 1000,
+                "recorded_ms": entry.get("ms"),
+                "decision": _decision(result),
+                "recorded": _decision(entry.get("result")),
+                "error": error,
+                "misses": tape.misses,
+            }
+
+    return list(await asyncio.gather(*(run_one(i, e) for i, e in enumerate(entries))))
+
+
+def _pct(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    return s[min(len(s) - 1, int(q * len(s)))]
+
+
+def summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ms = [r["ms"] for r in rows]
+    return {
+        "entries": len(rows),
+        "p50_ms": _pct(ms, 0.5),
+        "p95_ms": _pct(ms, 0.95),
+        "p99_ms": _pct(ms, 0.99),
+        "errors": sum(1 for r in rows if r["error"]),
+        "tape_misses": sum(r["misses"] for r in rows),
+        "changed_vs_recorded": sum(1 for r in rows if r["decision"] != r["recorded"]),
+    }
+
+
+def diff_runs(
+    current: List[Dict[str, Any]],
+    baseline: List[Dict[str, Any]],
+    regression_pct: float = 20.0,
+    min_delta_ms: float = 1.0,
+) -> Dict[str, Any]:
+    """
+    Compare two replay runs: routing decisions per entry and latency percentiles.
+
+    A percentile regresses when it grows by more than ``regression_pct`` percent and by at
+    least ``min_delta_ms`` (sub-millisecond paths are too noisy for a relative threshold).
+    """
+    base = {r["key"]: r for r in baseline}
+    changed = [
+        {"key": r["key"], "before": base[r["key"]]["decision"], "after": r["decision"]}
+        for r in current
+        if r["key"] in base and base[r["key"]]["decision"] != r["decision"]
+    ]
+    now, before = summarize(current), summarize(baseline)
+    regressions = {
+        k: {"before": before[k], "after": now[k]}
+        for k in ("p50_ms", "p95_ms", "p99_ms")
+        if before[k] > 0
+        and now[k] - before[k] >= min_delta_ms
+        and (now[k] - before[k]) / before[k] * 100 > regression_pct
+    }
+    return {"decision_changes": changed, "latency_regressions": regressions}
+
+
+def iter_report_lines(summary: Dict[str, Any], diff: Optional[Dict[str, Any]]) -> Iterator[str]:
+    yield (
+        f"entries={summary['entries']} p50={summary['p50_ms']:.2f}ms "
+        f"p95={summary['p95_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms "
+        f"errors={summary['errors']} tape_misses={summary['tape_misses']} "
+        f"changed_vs_recorded={summary['changed_vs_recorded']}"
+    )
+    if diff is None:
+        return
+    for k, v in diff["latency_regressions"].items():
+        yield f"REGRESSION {k}: {v['before']:.2f}ms -> {v['after']:.2f}ms"
+    for c in diff["decision_changes"]:
+        yield f"DECISION {c['key']}: {c['before']} -> {c['after']}"
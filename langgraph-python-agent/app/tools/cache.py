@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Optional, TypeVar
+
+from app.core.store import backend, get_store
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Small LRU cache with per-entry expiry for hot GHL lookups."""
+
+    def __init__(self, ttl: float = 300.0, max_items: int = 10_000) -> None:
+        self.ttl = ttl
+        self.max_items = max_items
+        self._data: "OrderedDict[str, tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[V]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: V) -> None:
+        now = time.monotonic()
+        self._data[key] = (now + self.ttl, value)
+        self._data.move_to_end(key)
+        # Least recently used first: drop expired entries there instead of holding them
+        # until max_items pushes them out
+        while len(self._data) > self.max_items or next(iter(self._data.values()))[0] < now:
+            self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    # Same interface as StoreCache for callers on the event loop
+    async def aget(self, key: str) -> Optional[V]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: V) -> None:
+        self.set(key, value)
+
+    async def apop(self, key: str) -> None:
+        self.pop(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class StoreCache:
+    """TTLCache-compatible view of a namespace in the shared store (multi-worker mode)."""
+
+    def __init__(self, ns: str, ttl: float = 300.0) -> None:
+        self.ns = ns
+        self.ttl = ttl
+
+    def get(self, key: str) -> Any:
+        return get_store().get(self.ns, key)
+
+    def set(self, key: str, value: Any) -> None:
+        get_store().set(self.ns, key, value, self.ttl)
+
+    def pop(self, key: str) -> None:
+        get_store().delete(self.ns, key)
+
+    async def aget(self, key: str) -> Any:
+        return await get_store().aget(self.ns, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        await get_store().aset(self.ns, key, value, self.ttl)
+
+    async def apop(self, key: str) -> None:
+        await get_store().adelete(self.ns, key)
+
+
+def make_cache(ns: str, ttl: float) -> Any:
+    # Shared backends keep invalidations from contact webhooks visible to every worker
+    return StoreCache(ns, ttl) if backend() != "memory" else TTLCache(ttl=ttl)
+
+
+CONTACT_CACHE_TTL = float(os.getenv("CONTACT_CACHE_TTL", "300"))
+
+# Contact payloads keyed by contact id; invalidated by contact webhook events. This is the
+# default location's cache; other locations get "contacts:<locationId>" (app/tools/tenants.py)
+contact_cache = make_cache("contacts", CONTACT_CACHE_TTL)
+
+CONVERSATION_CACHE_TTL = float(os.getenv("CONVERSATION_CACHE_TTL", "86400"))
+
+# Synced GHL conversation messages and cursor keyed by conversation id (app/nodes/sync_history.py)
+conversation_cache = make_cache("conversations", CONVERSATION_CACHE_TTL)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from app.tools.ghl_client import GhlClient, GhlError
+
+# Statuses worth retrying a page for; RateBudget already paused us for 429s
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _load_checkpoint(path: Optional[str]) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_checkpoint(path: Optional[str], data: Dict[str, Any]) -> None:
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+async def _fetch(
+    ghl: GhlClient,
+    limit: int,
+    location_id: Optional[str],
+    page: int = 1,
+    cursor: Optional[Dict[str, Any]] = None,
+    attempts: int = 5,
+) -> Dict[str, Any]:
+    cursor = cursor or {}
+    for attempt in range(attempts):
+        try:
+            return await ghl.list_contacts(
+                page=page,
+                limit=limit,
+                location_id=location_id,
+                start_after_id=cursor.get("start_after_id"),
+                start_after=cursor.get("start_after"),
+            )
+        except GhlError as e:
+            if e.status_code not in _RETRY_STATUS or attempt == attempts - 1:
+                raise
+            await asyncio.sleep(min(2**attempt, 10))
+    raise AssertionError("unreachable")
+
+
+def _contacts(page: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items = page.get("contacts")
+    return items if isinstance(items, list) else []
+
+
+async def _consume(
+    items: List[Dict[str, Any]], skip: int, checkpoint_path: Optional[str], position: Dict[str, Any]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield ``items`` after the first ``skip``, saving ``position`` plus the number consumed
+    each time the caller asks for the next one (it is done with the previous contact then).
+    """
+    for n, c in enumerate(items[skip:], skip + 1):
+        yield c
+        _save_checkpoint(checkpoint_path, {**position, "skip": n})
+
+
+async def iter_contacts(
+    ghl: GhlClient,
+    location_id: Optional[str] = None,
+    page_size: int = 100,
+    prefetch: int = 4,
+    checkpoint_path: Optional[str] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream every contact of a location, in API order.
+
+    When the first page reports ``meta.total``, later pages are fetched by page number with
+    up to ``prefetch`` requests in flight (yielded in order). Otherwise pagination follows
+    the ``startAfterId``/``startAfter`` cursor, fetching one page ahead of the consumer.
+    Progress is written to ``checkpoint_path`` after each contact the caller has finished
+    with (page, or page cursor, plus contacts consumed from it), and a later call with the
+    same path resumes right after the last one, so a crash mid-page repeats nothing.
+    """
+    ckpt = _load_checkpoint(checkpoint_path)
+    skip = int(ckpt.get("skip", 0))
+
+    if "cursor" in ckpt:
+        # Resume a cursor-mode run
+        cursor = ckpt["cursor"]
+        async for c in _iter_cursor(ghl, page_size, location_id, cursor, checkpoint_path, skip):
+            yield c
+        return
+
+    start = int(ckpt.get("page", 0)) + 1
+    first = await _fetch(ghl, page_size, location_id, page=start)
+    meta = first.get("meta") or {}
+    total = meta.get("total")
+    async for c in _consume(_contacts(first), skip, checkpoint_path, {"page": start - 1}):
+        yield c
+    _save_checkpoint(checkpoint_path, {"page": start})
+
+    if not isinstance(total, int):
+        cursor = {
+            "start_after_id": meta.get("startAfterId"),
+            "start_after": meta.get("startAfter"),
+        }
+        if cursor["start_after_id"] and _contacts(first):
+            async for c in _iter_cursor(ghl, page_size, location_id, cursor, checkpoint_path):
+                yield c
+        return
+
+    last = -(-total // page_size)
+    pending: Deque[asyncio.Task[Dict[str, Any]]] = deque()
+    next_page = start + 1
+    done = start
+    try:
+        while pending or next_page <= last:
+            while len(pending) < prefetch and next_page <= last:
+                fetch = _fetch(ghl, page_size, location_id, page=next_page)
+                pending.append(asyncio.create_task(fetch))
+                next_page += 1
+            page = await pending.popleft()
+            async for c in _consume(_contacts(page), 0, checkpoint_path, {"page": done}):
+                yield c
+            done += 1
+            _save_checkpoint(checkpoint_path, {"page": done})
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+async def _iter_cursor(
+    ghl: GhlClient,
+    page_size: int,
+    location_id: Optional[str],
+    cursor: Dict[str, Any],
+    checkpoint_path: Optional[str],
+    skip: int = 0,
+) -> AsyncIterator[Dict[str, Any]]:
+    nxt: Optional[asyncio.Task[Dict[str, Any]]] = asyncio.create_task(
+        _fetch(ghl, page_size, location_id, cursor=cursor)
+    )
+    try:
+        while nxt is not None:
+            page = await nxt
+            items = _contacts(page)
+            meta = page.get("meta") or {}
+            new_cursor = {
+                "start_after_id": meta.get("startAfterId"),
+                "start_after": meta.get("startAfter"),
+            }
+            # Prefetch the next page while the caller consumes this one
+            nxt = (
+                asyncio.create_task(_fetch(ghl, page_size, location_id, cursor=new_cursor))
+                if items and new_cursor["start_after_id"]
+                else None
+            )
+            async for c in _consume(items, skip, checkpoint_path, {"cursor": cursor}):
+                yield c
+            skip = 0
+            cursor = new_cursor
+            _save_checkpoint(checkpoint_path, {"cursor": cursor})
+    finally:
+        if nxt is not None:
+            nxt.cancel()
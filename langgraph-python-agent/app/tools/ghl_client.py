@@ -1,14 +1,67 @@
 from __future__ import annotations
 
+import asyncio
 import os
+import time
+import uuid
 from typing import Any, Dict, List, Optional
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+
+from app.core import metrics
+from app.core.store import get_store
+from app.tools import retries
+
+
+# Outcomes of non-idempotent writes (SMS, appointments) by idempotency key; a redelivered
+# webhook gets the recorded result instead of a second send
+GHL_WRITE_DEDUPE_TTL = float(
+    os.getenv("GHL_WRITE_DEDUPE_TTL", os.getenv("IDEMPOTENCY_TTL", "86400"))
+)
 
 
 class GhlError(Exception):
-    pass
+    @property
+    def status_code(self) -> Optional[int]:
+        resp = getattr(self.__cause__, "response", None)
+        return getattr(resp, "status_code", None)
+
+
+class RateBudget:
+    """
+    Tracks LeadConnector's burst limit from response headers and pauses callers before
+    the window is exhausted (X-RateLimit-Remaining / X-RateLimit-Interval-Milliseconds),
+    or for Retry-After after a 429.
+    """
+
+    def __init__(self, reserve: int = 5) -> None:
+        self.reserve = reserve
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.paused_until = 0.0
+
+    async def wait(self) -> None:
+        now = time.monotonic()
+        delay = self.paused_until - now
+        if self.remaining is not None and self.remaining <= self.reserve:
+            # Once reset_at passes the window is fresh again and this is <= 0
+            delay = max(delay, self.reset_at - now)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def update(self, resp: httpx.Response) -> None:
+        h = resp.headers
+        now = time.monotonic()
+        try:
+            if "x-ratelimit-remaining" in h:
+                self.remaining = int(h["x-ratelimit-remaining"])
+                interval = float(h.get("x-ratelimit-interval-milliseconds", "10000")) / 1000
+                if self.reset_at <= now:
+                    self.reset_at = now + interval
+            if resp.status_code == 429:
+                self.paused_until = now + float(h.get("retry-after", "1"))
+        except ValueError:
+            pass
 
 
 class GhlClient:
@@ -19,27 +72,34 @@ class GhlClient:
     def __init__(
         self,
         token: Optional[str] = None,
-        base_url: str = "https://services.leadconnectorhq.com",
+        base_url: Optional[str] = None,
         timeout: float = 20.0,
+        location_id: Optional[str] = None,
+        version: Optional[str] = None,
     ) -> None:
-        self.base_url = base_url.rstrip("/")
+        url = base_url or os.getenv("GHL_BASE_URL") or "https://services.leadconnectorhq.com"
+        self.base_url = url.rstrip("/")
         self.token = token or os.getenv("GHL_API_KEY") or ""
         if not self.token:
             # We don't raise immediately to allow local dev of non-API paths,
             # but API calls will fail with 401 until set.
             pass
         self.timeout = timeout
+        api_version = version or os.getenv("GHL_API_VERSION") or "2021-07-28"
         self._default_headers = {
             "Authorization": f"Bearer {self.token}",
             "Accept": "application/json",
             "Content-Type": "application/json",
             # LeadConnector requires API version header
-            "Version": os.getenv("GHL_API_VERSION", "2021-07-28"),
+            "Version": api_version,
         }
         # Many endpoints also expect a LocationId header; include if configured
-        loc_id = os.getenv("GHL_LOCATION_ID")
-        if loc_id:
-            self._default_headers["LocationId"] = loc_id
+        self.location_id = location_id or os.getenv("GHL_LOCATION_ID")
+        if self.location_id:
+            self._default_headers["LocationId"] = self.location_id
+        self._http: Optional[httpx.AsyncClient] = None
+        self._http_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.rate = RateBudget()
 
     def _headers(self, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
         if extra:
@@ -49,72 +109,124 @@ class GhlClient:
         return self._default_headers
 
     def _client(self) -> httpx.AsyncClient:
-        return httpx.AsyncClient(
-            base_url=self.base_url,
-            headers=self._headers(),
-            timeout=self.timeout,
-        )
+        # One pooled client per event loop; connections are reused across calls
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._http.is_closed or self._http_loop is not loop:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self._headers(),
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                event_hooks={"request": [self._before_request], "response": [self._after_response]},
+            )
+            self._http_loop = loop
+        return self._http
 
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
-    async def get_contact(self, contact_id: str) -> Dict[str, Any]:
+    async def _before_request(self, request: httpx.Request) -> None:
+        await self.rate.wait()
+
+    async def _after_response(self, response: httpx.Response) -> None:
+        self.rate.update(response)
+
+    async def _request(
+        self, name: str, policy: retries.RetryPolicy, method: str, url: str, **kwargs: Any
+    ) -> Dict[str, Any]:
         """
-        GET /contacts/{id}
+        Send a request under ``policy``. Retries also need time left before the caller's
+        deadline and a token from the shared retry budget; status errors raise GhlError.
         """
-        async with self._client() as cx:
-            resp = await cx.get(f"/contacts/{contact_id}")
+        retries.budget.on_request()
+        attempt = 0
+        while True:
             try:
+                resp = await self._client().request(
+                    method, url, timeout=retries.request_timeout(self.timeout), **kwargs
+                )
                 resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"get_contact failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
+                return resp.json()
+            except httpx.HTTPError as e:
+                attempt += 1
+                wait = policy.backoff(attempt)
+                if (attempt >= policy.attempts or not policy.retryable(e)
+                        or not retries.has_time(wait) or not retries.budget.try_spend()):
+                    if isinstance(e, httpx.HTTPStatusError):
+                        raise GhlError(f"{name} failed: {e}") from e
+                    raise
+                metrics.incr(f"ghl.retries.{name}")
+                await asyncio.sleep(wait)
+
+    async def _write_once(
+        self, name: str, key: Optional[str], method: str, url: str, **kwargs: Any
+    ) -> Dict[str, Any]:
+        """
+        Non-idempotent write: sent with an Idempotency-Key and, when ``key`` is set, at most
+        once per key. A write whose outcome is unknown (timeout after sending, 5xx) is not
+        repeated by later calls with the same key.
+        """
+        headers = {"Idempotency-Key": key or uuid.uuid4().hex}
+        if key is None:
+            return await self._request(name, retries.WRITE, method, url, headers=headers, **kwargs)
+        store = get_store()
+        if not await store.aadd("ghl_writes", key, GHL_WRITE_DEDUPE_TTL):
+            metrics.incr(f"ghl.write_deduped.{name}")
+            prior = await store.aget("ghl_writes", key)
+            if isinstance(prior, dict) and "result" in prior:
+                return prior["result"]
+            raise GhlError(
+                f"{name} not repeated: an earlier attempt is in flight or its outcome is unknown"
+            )
+        try:
+            result = await self._request(
+                name, retries.WRITE, method, url, headers=headers, **kwargs
+            )
+        except BaseException as e:
+            if retries.not_applied(e):
+                # GHL never acted on it; a redelivery may try again
+                await store.adelete("ghl_writes", key)
+            else:
+                await store.aset("ghl_writes", key, {"unknown": True}, GHL_WRITE_DEDUPE_TTL)
+                metrics.incr(f"ghl.write_unknown.{name}")
+            raise
+        await store.aset("ghl_writes", key, {"result": result}, GHL_WRITE_DEDUPE_TTL)
+        return result
+
+    async def warm(self) -> None:
+        """Open the connection pool (DNS + TLS) ahead of the first real request."""
+        try:
+            await self._client().head("/", timeout=5.0)
+        except httpx.HTTPError:
+            pass
+
+    async def aclose(self) -> None:
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
+    async def get_contact(self, contact_id: str) -> Dict[str, Any]:
+        """
+        GET /contacts/{id}
+        """
+        return await self._request("get_contact", retries.READ, "GET", f"/contacts/{contact_id}")
+
     async def list_tags(self, location_id: str) -> Dict[str, Any]:
         """
         GET /locations/{locationId}/tags
         """
-        async with self._client() as cx:
-            resp = await cx.get(f"/locations/{location_id}/tags")
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"list_tags failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
+        return await self._request(
+            "list_tags", retries.READ, "GET", f"/locations/{location_id}/tags"
+        )
+
     async def create_tag(self, location_id: str, name: str) -> Dict[str, Any]:
         """
         POST /locations/{locationId}/tags
+        Not idempotent (a replay may create a duplicate tag), so it is sent at most once per
+        key like other writes.
         """
-        async with self._client() as cx:
-            resp = await cx.post(f"/locations/{location_id}/tags", json={"name": name})
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"create_tag failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
+        key = retries.write_key("create_tag", location_id, name)
+        return await self._write_once(
+            "create_tag", key, "POST", f"/locations/{location_id}/tags", json={"name": name}
+        )
+
     async def assign_tags(self, contact_id: str, tag_names: List[str]) -> Dict[str, Any]:
         """
         POST /contacts/{contactId}/tags
@@ -122,20 +234,11 @@ class GhlClient:
         resolve IDs beforehand if your account requires it.
         """
         payload = {"tags": tag_names}
-        async with self._client() as cx:
-            resp = await cx.post(f"/contacts/{contact_id}/tags", json=payload)
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"assign_tags failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
+        return await self._request(
+            "assign_tags", retries.IDEMPOTENT_WRITE, "POST", f"/contacts/{contact_id}/tags",
+            json=payload,
+        )
+
     async def send_message(self, contact_id: str, text: str, channel: str = "sms") -> Dict[str, Any]:
         """
         POST /conversations/messages
@@ -146,68 +249,66 @@ class GhlClient:
             "message": {"text": text},
             "channel": channel,
         }
-        async with self._client() as cx:
-            resp = await cx.post("/conversations/messages", json=payload)
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"send_message failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
+        key = retries.write_key("send_message", contact_id)
+        return await self._write_once(
+            "send_message", key, "POST", "/conversations/messages", json=payload
+        )
+
+    async def get_messages(
+        self, conversation_id: str, limit: int = 20, last_message_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        GET /conversations/{conversationId}/messages
+        Newest first; pass ``last_message_id`` (from the previous page) to page backwards.
+        """
+        params: Dict[str, Any] = {"limit": limit}
+        if last_message_id:
+            params["lastMessageId"] = last_message_id
+        return await self._request(
+            "get_messages", retries.READ, "GET", f"/conversations/{conversation_id}/messages",
+            params=params,
+        )
+
     async def list_calendars(self, location_id: str) -> Dict[str, Any]:
         """
         GET /locations/{locationId}/calendars
         """
-        async with self._client() as cx:
-            resp = await cx.get(f"/locations/{location_id}/calendars")
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"list_calendars failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
-    async def list_contacts(self, page: int = 1, limit: int = 10) -> Dict[str, Any]:
+        return await self._request(
+            "list_calendars", retries.READ, "GET", f"/locations/{location_id}/calendars"
+        )
+
+    async def list_contacts(
+        self,
+        page: int = 1,
+        limit: int = 10,
+        location_id: Optional[str] = None,
+        start_after_id: Optional[str] = None,
+        start_after: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """
         GET /contacts
-        Requires Version header and often a LocationId header; both are set if env vars provided.
+        Requires Version header and often a LocationId header; both are set from the client's
+        location (or env vars).
+        Pass ``start_after_id``/``start_after`` (from ``meta``) for cursor pagination.
         """
-        params = {"page": page, "limit": limit}
-        async with self._client() as cx:
-            resp = await cx.get("/contacts", params=params)
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"list_contacts failed: {e}") from e
-            return resp.json()
-
-    @retry(
-        reraise=True,
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-        retry=retry_if_exception_type(httpx.HTTPError),
-    )
-    async def create_appointment(self, calendar_id: str, contact_id: str, iso_time: str) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"page": page, "limit": limit}
+        location_id = location_id or self.location_id
+        if location_id:
+            params["locationId"] = location_id
+        if start_after_id:
+            params["startAfterId"] = start_after_id
+            params["startAfter"] = start_after
+        return await self._request("list_contacts", retries.READ, "GET", "/contacts", params=params)
+
+    async def create_appointment(
+        self, calendar_id: str, contact_id: str, iso_time: str
+    ) -> Dict[str, Any]:
         """
         POST /appointments/
         """
         payload = {"calendarId": calendar_id, "contactId": contact_id, "startTime": iso_time}
-        async with self._client() as cx:
-            resp = await cx.post("/appointments/", json=payload)
-            try:
-                resp.raise_for_status()
-            except httpx.HTTPStatusError as e:
-                raise GhlError(f"create_appointment failed: {e}") from e
-            return resp.json()
+        key = retries.write_key("create_appointment", calendar_id, contact_id)
+        return await self._write_once(
+            "create_appointment", key, "POST", "/appointments/", json=payload
+        )
 
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import os
+import time
+from typing import List, Literal, Optional, Tuple
+
+from app.core import metrics
+from app.core.store import get_store
+
+# A claimed slot is held for SLOT_HOLD_TTL seconds while GHL confirms the appointment; a
+# confirmed slot stays booked in the ledger until an hour after it starts.
+SLOT_HOLD_TTL = float(os.getenv("SLOT_HOLD_TTL", "120"))
+
+Claim = Literal["held", "mine", "taken"]
+
+
+class SlotLedger:
+    """
+    Local reservation ledger for calendar slots, in the shared store (leases for holds,
+    keys for confirmed bookings), so conflicts between concurrent bookings, and repeated
+    confirmations from one lead, are settled before calling GHL.
+    """
+
+    def __init__(self, hold_ttl: float = SLOT_HOLD_TTL) -> None:
+        self.hold_ttl = hold_ttl
+
+    @staticmethod
+    def _key(calendar_id: str, slot: str) -> str:
+        return f"slot:{calendar_id}:{slot}"
+
+    async def claim(self, calendar_id: str, slot: str, owner: str) -> Tuple[Claim, Optional[str]]:
+        """
+        Try to hold ``slot`` for ``owner`` (a contact id).
+
+        Returns ("held", None) when the caller should create the appointment and then
+        confirm() or release(); ("mine", appointment_id) when this owner already booked it;
+        ("taken", None) when another owner holds or booked it.
+        """
+        store = get_store()
+        key = self._key(calendar_id, slot)
+        booked = await store.aget("slots", key)
+        if booked is None and await store.atry_lease(key, owner, self.hold_ttl):
+            # Re-check: a confirm may have landed between the read and the lease
+            booked = await store.aget("slots", key)
+            if booked is None:
+                metrics.incr("booking.slot_held")
+                return "held", None
+            await store.arelease_lease(key, owner)
+        if booked is not None and booked.get("owner") == owner:
+            metrics.incr("booking.slot_reused")
+            return "mine", booked.get("appointment_id")
+        metrics.incr("booking.slot_taken")
+        return "taken", None
+
+    async def booked_by(
+        self, calendar_id: str, slots: List[str], owner: str
+    ) -> Optional[Tuple[str, Optional[str]]]:
+        """(slot, appointment_id) of ``owner``'s confirmed booking among ``slots``, if any."""
+        store = get_store()
+        for slot in slots:
+            booked = await store.aget("slots", self._key(calendar_id, slot))
+            if booked is not None and booked.get("owner") == owner:
+                return slot, booked.get("appointment_id")
+        return None
+
+    async def confirm(self, calendar_id: str, slot: str, owner: str, appointment_id: Optional[str],
+                starts_at: float) -> None:
+        """Record a GHL-confirmed booking, then drop the hold."""
+        key = self._key(calendar_id, slot)
+        store = get_store()
+        ttl = max(starts_at - time.time() + 3600, 60.0)
+        await store.aset("slots", key, {"owner": owner, "appointment_id": appointment_id}, ttl)
+        await store.arelease_lease(key, owner)
+
+    async def release(self, calendar_id: str, slot: str, owner: str) -> None:
+        """Drop a hold whose appointment could not be created."""
+        await get_store().arelease_lease(self._key(calendar_id, slot), owner)
+        metrics.incr("booking.slot_released")
+
+
+# Process-wide ledger (shared across workers when STORE_BACKEND=sqlite)
+ledger = SlotLedger()
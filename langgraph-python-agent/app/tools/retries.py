@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, FrozenSet, Iterator, Optional
+
+import httpx
+
+from app.core import metrics
+
+# Retry policies for GHL calls, a process-wide retry budget and the caller's deadline.
+#   GHL_RETRY_BUDGET_RATIO   retries allowed per request (0.1 = at most ~10% extra load)
+#   GHL_RETRY_MIN_PER_S      retries always allowed per second, so low traffic still retries
+#   WEBHOOK_DEADLINE_S       time a webhook's graph run may spend; retries stop when it is up
+GHL_RETRY_BUDGET_RATIO = float(os.getenv("GHL_RETRY_BUDGET_RATIO", "0.1"))
+GHL_RETRY_MIN_PER_S = float(os.getenv("GHL_RETRY_MIN_PER_S", "1"))
+WEBHOOK_DEADLINE_S = float(os.getenv("WEBHOOK_DEADLINE_S", "30"))
+
+_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class DeadlineExceeded(Exception):
+    """The caller's deadline passed before a GHL call could be (re)tried."""
+
+
+def _not_sent(err: Exception) -> bool:
+    # Failures where GHL never processed the request: no connection, or rejected by the rate limit
+    if isinstance(err, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    return isinstance(err, httpx.HTTPStatusError) and err.response.status_code == 429
+
+
+def not_applied(err: BaseException) -> bool:
+    """True when a failed write certainly had no effect on GHL (safe to send again later)."""
+    if isinstance(err, DeadlineExceeded):
+        return True
+    cause = err.__cause__ if isinstance(err.__cause__, httpx.HTTPError) else err
+    if isinstance(cause, httpx.HTTPStatusError):
+        return cause.response.status_code < 500  # rejected (4xx, incl. 429), not processed
+    return isinstance(cause, Exception) and _not_sent(cause)
+
+
+class RetryPolicy:
+    """
+    Attempts and backoff for one class of endpoint. ``safe`` policies retry any transport
+    error and retryable status; others retry only failures where the request was not sent.
+    """
+
+    def __init__(self, attempts: int, safe: bool, base: float = 0.5, max_wait: float = 4.0,
+                 statuses: FrozenSet[int] = _RETRY_STATUS) -> None:
+        self.attempts = attempts
+        self.safe = safe
+        self.base = base
+        self.max_wait = max_wait
+        self.statuses = statuses
+
+    def retryable(self, err: Exception) -> bool:
+        if not self.safe:
+            return _not_sent(err)
+        if isinstance(err, httpx.HTTPStatusError):
+            return err.response.status_code in self.statuses
+        return isinstance(err, httpx.TransportError)
+
+    def backoff(self, attempt: int) -> float:
+        # Exponential with jitter so callers that failed together don't retry together
+        return min(self.max_wait, self.base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+# Reads; writes that converge on repeat (adding a tag); writes that must not be repeated
+# (SMS, appointments), deduplicated by idempotency key instead of retried blindly
+READ = RetryPolicy(attempts=3, safe=True)
+IDEMPOTENT_WRITE = RetryPolicy(attempts=3, safe=True)
+WRITE = RetryPolicy(attempts=3, safe=False)
+
+
+class RetryBudget:
+    """
+    Token bucket shared by every GHL client: each request deposits ``ratio`` tokens, time
+    adds ``min_per_s``, and each retry spends one. During an outage retries stay near
+    ``ratio`` of traffic instead of multiplying it.
+    """
+
+    def __init__(
+        self, ratio: float = GHL_RETRY_BUDGET_RATIO, min_per_s: float = GHL_RETRY_MIN_PER_S
+    ) -> None:
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.cap = max(10.0, min_per_s * 10)
+        self.tokens = self.cap
+        self.updated = time.monotonic()
+
+    def on_request(self) -> None:
+        self.tokens = min(self.cap, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.cap, self.tokens + (now - self.updated) * self.min_per_s)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        metrics.incr("ghl.retry_budget_exhausted")
+        return False
+
+
+# Process-wide budget
+budget = RetryBudget()
+
+
+# Deadline of the current webhook run (monotonic seconds); None = no limit
+_deadline: ContextVar[Optional[float]] = ContextVar("ghl_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """
+    Bound GHL calls made inside (including retries) to ``seconds`` from now, or an outer
+    deadline.
+    """
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def request_timeout(default: float) -> float:
+    """Per-attempt timeout: the client's, capped by the time left; raises once it is up."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        metrics.incr("ghl.deadline_exceeded")
+        raise DeadlineExceeded("deadline exceeded before GHL call")
+    return min(default, left)
+
+
+def has_time(wait: float) -> bool:
+    left = remaining()
+    return left is None or left > wait + 0.5
+
+
+# Idempotency scope: writes made while handling one inbound message get stable keys, so a
+# redelivered webhook (or a rerun after a crash) finds the earlier write instead of repeating it
+class _Scope:
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.counts: Dict[str, int] = {}
+
+
+_scope: ContextVar[Optional[_Scope]] = ContextVar("ghl_idempotency_scope", default=None)
+
+
+@contextmanager
+def idempotency_scope(key: Optional[str]) -> Iterator[None]:
+    token = _scope.set(_Scope(key) if key else None)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def write_key(name: str, *parts: str) -> Optional[str]:
+    """
+    Key for the n-th ``name`` write on ``parts`` (e.g. the contact) in the current scope;
+    None outside a scope. Payload text is left out since an LLM reply differs on rerun.
+    """
+    scope = _scope.get()
+    if scope is None:
+        return None
+    op = ":".join((name, *parts))
+    n = scope.counts.get(op, 0)
+    scope.counts[op] = n + 1
+    return hashlib.sha1(f"{scope.key}:{op}:{n}".encode()).hexdigest()
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Set
+
+from app.core import metrics
+from app.core.store import backend
+from app.tools.cache import (
+    CONTACT_CACHE_TTL,
+    CONVERSATION_CACHE_TTL,
+    contact_cache,
+    conversation_cache,
+    make_cache,
+)
+from app.tools.ghl_client import GhlClient
+
+# One deployment serves many GHL locations (sub-accounts). Credentials per location come from
+# GHL_LOCATIONS_FILE, a JSON object keyed by location id:
+#   {"<locationId>": {"api_key": "...", "version": "2021-07-28", "base_url": "..."}}
+# Locations missing from the file (and webhooks without a location) share the default tenant
+# (GHL_API_KEY / GHL_LOCATION_ID); no client is ever made for a location id taken from a
+# payload alone. Each listed location gets its own pooled client, rate budget and
+# contact/conversation cache namespaces; tenants idle for TENANT_IDLE_TTL seconds or beyond
+# TENANT_MAX are evicted (LRU).
+TENANT_MAX = int(os.getenv("TENANT_MAX", "500"))
+TENANT_IDLE_TTL = float(os.getenv("TENANT_IDLE_TTL", "3600"))
+
+_location: ContextVar[Optional[str]] = ContextVar("ghl_location", default=None)
+
+
+class Tenant:
+    """Per-location GHL client (own connection pool and rate budget) and caches."""
+
+    def __init__(
+        self, location_id: Optional[str], client: GhlClient, contacts: Any, conversations: Any
+    ) -> None:
+        self.location_id = location_id
+        self.client = client
+        self.contacts = contacts
+        self.conversations = conversations
+        self.last_used = time.monotonic()
+
+
+def _load_credentials() -> Dict[str, Dict[str, Any]]:
+    path = os.getenv("GHL_LOCATIONS_FILE")
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+
+
+class TenantRegistry:
+    """LRU registry of tenants keyed by location id."""
+
+    def __init__(self, max_tenants: int = TENANT_MAX, idle_ttl: float = TENANT_IDLE_TTL) -> None:
+        self.max_tenants = max(1, max_tenants)
+        self.idle_ttl = idle_ttl
+        self._credentials: Optional[Dict[str, Dict[str, Any]]] = None
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        self._default: Optional[Tenant] = None
+        self._lock = threading.Lock()
+
+    @property
+    def credentials(self) -> Dict[str, Dict[str, Any]]:
+        if self._credentials is None:
+            self._credentials = _load_credentials()
+        return self._credentials
+
+    def default(self) -> Tenant:
+        """The env-configured location (GHL_API_KEY / GHL_LOCATION_ID); never evicted."""
+        if self._default is None:
+            self._default = Tenant(
+                os.getenv("GHL_LOCATION_ID"), GhlClient(), contact_cache, conversation_cache
+            )
+        return self._default
+
+    def _is_default(self, location_id: Optional[str]) -> bool:
+        return (not location_id or location_id == self.default().location_id
+                or location_id not in self.credentials)
+
+    def get(self, location_id: Optional[str]) -> Tenant:
+        if self._is_default(location_id):
+            if location_id and location_id != self.default().location_id:
+                metrics.incr("tenants.unlisted")
+            return self.default()
+        assert location_id is not None
+        with self._lock:
+            tenant = self._tenants.get(location_id)
+            if tenant is None:
+                creds = self.credentials[location_id]
+                client = GhlClient(
+                    token=creds.get("api_key"),
+                    base_url=creds.get("base_url"),
+                    location_id=location_id,
+                    version=creds.get("version"),
+                )
+                tenant = Tenant(
+                    location_id,
+                    client,
+                    make_cache(f"contacts:{location_id}", CONTACT_CACHE_TTL),
+                    make_cache(f"conversations:{location_id}", CONVERSATION_CACHE_TTL),
+                )
+                self._tenants[location_id] = tenant
+                metrics.incr("tenants.created")
+            self._tenants.move_to_end(location_id)
+            tenant.last_used = time.monotonic()
+            self._evict()
+            metrics.set_gauge("tenants.active", len(self._tenants) + 1)
+            return tenant
+
+    async def invalidate_contact(self, location_id: Optional[str], contact_id: str) -> None:
+        """Drop a cached contact without creating a tenant for an inactive location."""
+        if self._is_default(location_id):
+            await self.default().contacts.apop(contact_id)
+            return
+        assert location_id is not None
+        tenant = self._tenants.get(location_id)
+        if tenant is not None:
+            await tenant.contacts.apop(contact_id)
+        elif backend() != "memory":
+            # Another worker may hold this tenant; the shared namespace is all that matters
+            await make_cache(f"contacts:{location_id}", CONTACT_CACHE_TTL).apop(contact_id)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._tenants:
+            location_id, tenant = next(iter(self._tenants.items()))
+            if len(self._tenants) <= self.max_tenants and now - tenant.last_used < self.idle_ttl:
+                break
+            del self._tenants[location_id]
+            _close_later(tenant)
+            metrics.incr("tenants.evicted")
+
+    async def aclose(self) -> None:
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+        if self._default is not None:
+            tenants.append(self._default)
+        for tenant in tenants:
+            await tenant.client.aclose()
+        # Evicted clients still in their grace period are closed now
+        pending = list(_closing)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+# Delayed closes of evicted tenants' clients, kept referenced until they finish
+_closing: Set[asyncio.Task[None]] = set()
+
+
+async def _close_after(client: GhlClient, delay: float) -> None:
+    try:
+        await asyncio.sleep(delay)
+    finally:
+        await client.aclose()
+
+
+def _close_later(tenant: Tenant) -> None:
+    # Evicted tenants may still have a request in flight; close the pool after it finishes
+    for cache in (tenant.contacts, tenant.conversations):
+        clear = getattr(cache, "clear", None)
+        if clear is not None:
+            clear()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(_close_after(tenant.client, 30.0))
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+# Process-wide registry
+registry = TenantRegistry()
+
+
+@contextmanager
+def use_location(location_id: Optional[str]) -> Iterator[None]:
+    """Route GHL calls and contact cache access made inside to ``location_id``'s tenant."""
+    token = _location.set(location_id)
+    try:
+        yield
+    finally:
+        _location.reset(token)
+
+
+def current() -> Tenant:
+    return registry.get(_location.get())
+
+
+class TenantGhl:
+    """GhlClient stand-in that forwards each call to the current location's client."""
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(current().client, name)
+
+    async def warm(self) -> None:
+        await registry.default().client.warm()
+
+    async def aclose(self) -> None:
+        await registry.aclose()
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from typing import Awaitable, Callable, Dict, Literal
+
+from app.core import metrics
+from app.tools.tenants import registry
+from app.web.schema import GhlWebhook
+
+# What the webhook should do with an event after routing
+Action = Literal["graph", "drop", "handled"]
+Handler = Callable[[GhlWebhook], Awaitable[None]]
+
+# Events that carry a lead's message and should run the agent graph
+GRAPH_EVENTS = {"InboundMessage"}
+
+# Events with nothing for the agent to do: our own sends echoed back, delivery/read
+# receipts and bookkeeping notifications
+DROP_EVENTS = {
+    "OutboundMessage",
+    "ConversationProviderOutboundMessage",
+    "ConversationUnreadUpdate",
+    "LCEmailStats",
+    "NoteCreate",
+    "NoteUpdate",
+    "NoteDelete",
+    "TaskCreate",
+    "TaskComplete",
+    "TaskDelete",
+    "OpportunityCreate",
+    "OpportunityUpdate",
+    "OpportunityStatusUpdate",
+    "OpportunityStageUpdate",
+    "OpportunityDelete",
+    "AppointmentCreate",
+    "AppointmentUpdate",
+    "AppointmentDelete",
+}
+
+
+async def _invalidate_contact(hook: GhlWebhook) -> None:
+    # Contact events carry the contact id as "id" (or "contactId" on some versions)
+    contact_id = hook.contact_id or hook.id
+    if contact_id:
+        await registry.invalidate_contact(hook.location_id, str(contact_id))
+
+
+# Lightweight handlers that run inline instead of the graph
+HANDLERS: Dict[str, Handler] = {
+    "ContactCreate": _invalidate_contact,
+    "ContactUpdate": _invalidate_contact,
+    "ContactDelete": _invalidate_contact,
+    "ContactTagUpdate": _invalidate_contact,
+    "ContactDndUpdate": _invalidate_contact,
+}
+
+
+# Event types with a metric series of their own; any other type counts as "unknown", so a
+# payload can't create new metric names
+KNOWN_EVENTS = GRAPH_EVENTS | DROP_EVENTS | set(HANDLERS)
+
+
+async def route_event(hook: GhlWebhook) -> tuple[Action, str]:
+    """
+    Decide how to handle a webhook before any State is built.
+
+    Returns the action and the event type label used for metrics ("unknown" for types
+    outside KNOWN_EVENTS). Untyped payloads (e.g. custom workflow webhooks) go to the graph
+    only when they carry text.
+    """
+    etype = hook.event_type
+    label = (etype if etype in KNOWN_EVENTS else "unknown") if etype else "untyped"
+    metrics.incr(f"events.{label}")
+
+    if etype in GRAPH_EVENTS:
+        action: Action = "graph" if hook.text else "drop"
+    elif etype in HANDLERS:
+        try:
+            await HANDLERS[etype](hook)
+        except Exception:
+            # Cache maintenance is best-effort; never fail the webhook for it
+            metrics.incr(f"events.{label}.handler_error")
+        action = "handled"
+    elif etype in DROP_EVENTS:
+        action = "drop"
+    else:
+        action = "graph" if hook.text else "drop"
+
+    metrics.incr(f"events.action.{action}")
+    return action, label
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import asyncio
+import glob
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from app.core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Graceful drain on SIGTERM (rolling deploys):
+#   1. /ready answers 503 "draining"; requests are still served for DRAIN_READY_DELAY_S so the
+#      load balancer can take the instance out of rotation without refused connections
+#   2. the signal is passed on to uvicorn, which stops accepting connections and waits for
+#      in-flight requests
+#   3. graph runs still going DRAIN_TIMEOUT_S after the signal are cancelled and written to
+#      HANDOFF_DIR together with deferred messages; their webhooks answer "handed_off"
+#   4. the next instance sharing HANDOFF_DIR claims those files at startup and runs them
+DRAIN_READY_DELAY_S = float(os.getenv("DRAIN_READY_DELAY_S", "5"))
+DRAIN_TIMEOUT_S = float(os.getenv("DRAIN_TIMEOUT_S", "20"))
+HANDOFF_DIR = os.getenv("HANDOFF_DIR", ".agent-state/handoff")
+
+
+class Lifecycle:
+    """Tracks in-flight graph runs, drains them on SIGTERM and hands off what is left."""
+
+    def __init__(self) -> None:
+        self.draining = False
+        self._runs: Dict[asyncio.Task[Any], Dict[str, Any]] = {}
+        self._handed_off: Set[asyncio.Task[Any]] = set()
+        self._drain_task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def inflight(self) -> int:
+        return len(self._runs)
+
+    async def run(self, record: Dict[str, Any], coro: Awaitable[Any]) -> Tuple[bool, Any]:
+        """
+        Run ``coro`` as a tracked task. ``record`` is what gets persisted if the run is still
+        going at the drain deadline; returns (False, None) in that case, else (True, result).
+        """
+        task = asyncio.ensure_future(coro)
+        self._runs[task] = record
+        task.add_done_callback(self._forget)
+        # wait() doesn't raise when the task is cancelled by a hand-off; if the caller itself
+        # is cancelled the run carries on, still tracked
+        await asyncio.wait({task})
+        if task in self._handed_off:
+            self._handed_off.discard(task)
+            return False, None
+        return True, task.result()
+
+    def _forget(self, task: asyncio.Task[Any]) -> None:
+        self._runs.pop(task, None)
+        metrics.set_gauge("lifecycle.inflight", len(self._runs))
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Take over SIGTERM (called at startup, after uvicorn installed its handler)."""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        prev = signal.getsignal(signal.SIGTERM)
+
+        def on_term(sig: int, frame: Any) -> None:
+            if self.draining and callable(prev):
+                prev(sig, frame)  # second SIGTERM: let the server exit now
+                return
+            loop.call_soon_threadsafe(self._start_drain, lambda: _forward(prev, sig, frame))
+
+        signal.signal(signal.SIGTERM, on_term)
+
+    def _start_drain(self, stop_server: Callable[[], None]) -> None:
+        if self.draining:
+            return
+        self.draining = True
+        metrics.set_gauge("lifecycle.draining", 1)
+        logger.info("SIGTERM: draining %d in-flight run(s)", len(self._runs))
+        self._drain_task = asyncio.ensure_future(self._drain(stop_server))
+
+    async def _drain(self, stop_server: Callable[[], None]) -> None:
+        deadline = time.monotonic() + DRAIN_TIMEOUT_S
+        await asyncio.sleep(min(DRAIN_READY_DELAY_S, DRAIN_TIMEOUT_S))
+        stop_server()
+        while self._runs and time.monotonic() < deadline:
+            await asyncio.wait(set(self._runs), timeout=deadline - time.monotonic())
+        self.hand_off()
+
+    def hand_off(self) -> int:
+        """Cancel runs still in flight and persist them for the next instance."""
+        tasks = [t for t in self._runs if not t.done()]
+        if not tasks:
+            return 0
+        save([self._runs[t] for t in tasks])
+        for task in tasks:
+            self._handed_off.add(task)
+            task.cancel()
+        metrics.incr("lifecycle.handed_off", len(tasks))
+        logger.warning("handed off %d unfinished run(s) to %s", len(tasks), HANDOFF_DIR)
+        return len(tasks)
+
+
+def _forward(prev: Any, sig: int, frame: Any) -> None:
+    if callable(prev):
+        prev(sig, frame)
+    else:
+        # No server handler (SIG_DFL): restore it and re-raise so the process exits
+        signal.signal(sig, prev)
+        signal.raise_signal(sig)
+
+
+def save(records: List[Dict[str, Any]]) -> None:
+    """Append hand-off records to this process's file in HANDOFF_DIR."""
+    if not records:
+        return
+    os.makedirs(HANDOFF_DIR, exist_ok=True)
+    path = os.path.join(HANDOFF_DIR, f"handoff-{os.getpid()}-{int(time.time())}.jsonl")
+    with open(path, "ab") as f:
+        for record in records:
+            f.write(orjson.dumps(record) + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def claim() -> List[Dict[str, Any]]:
+    """Take every hand-off file in HANDOFF_DIR; a rename makes each one go to one worker."""
+    out: List[Dict[str, Any]] = []
+    for path in sorted(glob.glob(os.path.join(HANDOFF_DIR, "handoff-*.jsonl"))):
+        mine = f"{path}.claimed-{os.getpid()}"
+        try:
+            os.rename(path, mine)
+        except OSError:
+            continue  # another worker got it
+        with open(mine, "rb") as f:
+            for line in f:
+                try:
+                    out.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    pass  # torn last line of a killed writer
+        os.remove(mine)
+    if out:
+        metrics.incr("lifecycle.resumed", len(out))
+    return out
+
+
+# Process-wide lifecycle
+lifecycle = Lifecycle()
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, nullcontext
+from typing import Any, AsyncContextManager, AsyncIterator, Dict, List, Tuple
+
+import orjson
+from fastapi import Request
+
+from app.core import metrics
+
+# Per-request sampling profiler for the webhook handler. A request is profiled when it carries
+# "X-Profile: <PROFILE_TOKEN>", while the admin toggle (POST /debug/profile) has requests
+# left, or at random with PROFILE_SAMPLE_RATE (0..1). With no PROFILE_TOKEN set, the header
+# and the admin endpoints are refused.
+# Each profile writes to PROFILE_DIR:
+#   <name>.folded       collapsed stacks (flamegraph.pl, speedscope, inferno)
+#   <name>.trace.json   which asyncio task held the event loop over time (Perfetto /
+#                       chrome://tracing)
+# Samples cover the event loop thread, so work of concurrent requests shows up as well;
+# only one profile runs at a time. The files are rendered and written on a worker thread.
+# With no trigger, the cost is a header lookup.
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".agent-state/profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+_toggle_remaining = 0
+_busy = threading.Lock()
+
+
+def authorized(req: Request) -> bool:
+    """True when the request carries PROFILE_TOKEN; always False while no token is set."""
+    given = req.headers.get("x-profile")
+    return bool(PROFILE_TOKEN) and given is not None and hmac.compare_digest(given, PROFILE_TOKEN)
+
+
+def enable(count: int) -> int:
+    """Profile the next ``count`` webhook requests (0 turns the toggle off)."""
+    global _toggle_remaining
+    _toggle_remaining = max(0, count)
+    return _toggle_remaining
+
+
+def _requested(req: Request) -> bool:
+    global _toggle_remaining
+    if authorized(req):
+        return True
+    if _toggle_remaining > 0:
+        _toggle_remaining -= 1
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)})"
+
+
+class _Sampler(threading.Thread):
+    """Samples one thread's Python stack and the event loop's running task."""
+
+    def __init__(self, thread_id: int, loop: asyncio.AbstractEventLoop, interval: float) -> None:
+        super().__init__(name="request-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.loop = loop
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.timeline: List[Tuple[float, str]] = []
+        self.start_time = time.perf_counter()
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        current_tasks: Dict[Any, Any] = asyncio.tasks._current_tasks  # type: ignore[attr-defined]
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+            task = current_tasks.get(self.loop)
+            self.timeline.append(
+                (time.perf_counter() - self.start_time, task.get_name() if task else "(idle)")
+            )
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def folded(self) -> bytes:
+        return "".join(f"{s} {n}\n" for s, n in self.stacks.most_common()).encode()
+
+    def trace(self) -> bytes:
+        # Merge consecutive samples of the same task into Chrome trace "complete" events
+        events: List[Dict[str, Any]] = []
+        tids: Dict[str, int] = {}
+        step = self.interval * 1e6
+        gap = max(step, sys.getswitchinterval() * 1e6) * 2
+        for t, name in self.timeline:
+            tid = tids.setdefault(name, len(tids) + 1)
+            ts = t * 1e6
+            last = events[-1] if events else None
+            if last is not None and last["tid"] == tid and ts - (last["ts"] + last["dur"]) <= gap:
+                last["dur"] = ts - last["ts"] + step
+            else:
+                events.append(
+                    {"name": name, "ph": "X", "pid": 1, "tid": tid, "ts": ts, "dur": step}
+                )
+        meta = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+            for name, tid in tids.items()
+        ]
+        return orjson.dumps({"traceEvents": meta + events, "displayTimeUnit": "ms"})
+
+
+def _save(sampler: _Sampler, name: str) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, name)
+    with open(f"{base}.folded", "wb") as f:
+        f.write(sampler.folded())
+    with open(f"{base}.trace.json", "wb") as f:
+        f.write(sampler.trace())
+
+
+@asynccontextmanager
+async def _profile(name: str) -> AsyncIterator[None]:
+    if not _busy.acquire(blocking=False):
+        yield  # another profile is running
+        return
+    try:
+        sampler = _Sampler(
+            threading.get_ident(), asyncio.get_running_loop(), PROFILE_INTERVAL_MS / 1000
+        )
+        # The sampler needs the GIL to look at the loop thread; a shorter switch interval
+        # lets it in during CPU bursts shorter than the default 5 ms
+        switch = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch, sampler.interval / 4))
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sys.setswitchinterval(switch)
+            await asyncio.to_thread(_save, sampler, name)
+            metrics.incr("profiling.profiles")
+    finally:
+        _busy.release()
+
+
+def maybe_profile(req: Request) -> AsyncContextManager[None]:
+    """Profile the enclosed block if this request asked for it (or was sampled)."""
+    if not _requested(req):
+        return nullcontext()
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return _profile(f"{stamp}-{os.getpid()}-{time.perf_counter_ns() % 1_000_000:06d}")
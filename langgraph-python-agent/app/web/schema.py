@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, field_validator
+
+Channel = Literal["sms", "facebook", "instagram"]
+
+# Normalize channel spellings seen in GHL payloads to State literals
+CHANNEL_MAP: Dict[str, Channel] = {
+    "sms": "sms",
+    "facebook": "facebook",
+    "fb": "facebook",
+    "instagram": "instagram",
+    "ig": "instagram",
+}
+
+
+class _Model(BaseModel):
+    # Webhooks carry many fields we don't use; ignore them and accept numeric ids
+    model_config = ConfigDict(extra="ignore", coerce_numbers_to_str=True)
+
+
+class _Ref(_Model):
+    id: Optional[str] = None
+
+
+class _Message(_Model):
+    text: Optional[str] = None
+
+
+class _Data(_Model):
+    type: Optional[str] = None
+    event: Optional[str] = None
+    messageId: Optional[str] = None
+    contactId: Optional[str] = None
+    conversationId: Optional[str] = None
+    locationId: Optional[str] = None
+    body: Optional[str] = None
+    channel: Optional[str] = None
+
+
+class GhlWebhook(_Model):
+    """
+    Typed view of the Go High Level (LeadConnector) webhook shapes we accept.
+
+    Decoded and validated in one pass with ``GhlWebhook.model_validate_json(raw_bytes)``;
+    the properties resolve the top-level / nested / ``data`` fallbacks. Adjust keys here to
+    your exact webhook configuration.
+    """
+
+    type: Optional[str] = None
+    event: Optional[str] = None
+    id: Optional[str] = None
+    messageId: Optional[str] = None
+    contactId: Optional[str] = None
+    conversationId: Optional[str] = None
+    locationId: Optional[str] = None
+    body: Optional[str] = None
+    channel: Optional[str] = None
+    contact: Optional[_Ref] = None
+    conversation: Optional[_Ref] = None
+    message: Optional[_Message] = None
+    data: Optional[_Data] = None
+
+    @field_validator("contact", "conversation", "message", "data", mode="before")
+    @classmethod
+    def _only_objects(cls, v: Any) -> Any:
+        # Some event types reuse these keys for scalars; treat those as absent
+        return v if isinstance(v, dict) else None
+
+    @field_validator("body", mode="before")
+    @classmethod
+    def _only_text(cls, v: Any) -> Any:
+        return v if isinstance(v, str) else None
+
+    @property
+    def event_type(self) -> Optional[str]:
+        d = self.data
+        return self.type or self.event or (d and (d.type or d.event)) or None
+
+    @property
+    def contact_id(self) -> Optional[str]:
+        c, d = self.contact, self.data
+        return self.contactId or (c and c.id) or (d and d.contactId) or None
+
+    @property
+    def text(self) -> Optional[str]:
+        m, d = self.message, self.data
+        return (m and m.text) or self.body or (d and d.body) or None
+
+    @property
+    def conversation_id(self) -> Optional[str]:
+        c, d = self.conversation, self.data
+        return self.conversationId or (c and c.id) or (d and d.conversationId) or None
+
+    @property
+    def message_id(self) -> Optional[str]:
+        d = self.data
+        return self.messageId or (d and d.messageId) or None
+
+    @property
+    def location_id(self) -> Optional[str]:
+        d = self.data
+        return self.locationId or (d and d.locationId) or None
+
+    def fields(self) -> Dict[str, Optional[str]]:
+        d = self.data
+        return {
+            "contact_id": self.contact_id,
+            "latest_text": self.text,
+            "channel": self.channel or (d and d.channel) or "sms",
+            "conversation_id": self.conversation_id,
+            "location_id": self.location_id,
+        }
+
+
+def normalize_channel(channel: Optional[str]) -> Optional[Channel]:
+    return CHANNEL_MAP.get(str(channel).lower()) if channel else "sms"
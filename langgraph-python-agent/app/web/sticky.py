@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import zlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import ValidationError
+
+from app.web.batch import BATCH_MAX_EVENTS, iter_events
+from app.web.schema import GhlWebhook
+
+# Front process for sticky mode (python main.py --workers N --sticky): hashes each
+# webhook's contact id to one worker so a contact's locks, caches and checkpoints stay hot
+# in a single process. Batches are split by contact, each worker getting its contacts'
+# events in request order. Every other path (metrics, debug, campaigns) goes to the first
+# worker. Workers listen on 127.0.0.1 at the ports in WORKER_PORTS.
+
+
+def worker_ports() -> List[int]:
+    return [int(p) for p in os.getenv("WORKER_PORTS", "").split(",") if p]
+
+
+def pick_worker(contact_id: Optional[str], n: int) -> int:
+    """Stable contact -> worker index (crc32, identical across processes and restarts)."""
+    if not contact_id:
+        return 0
+    return zlib.crc32(contact_id.encode()) % n
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    global _client
+    _client = httpx.AsyncClient(
+        timeout=120.0, limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+    )
+    try:
+        yield
+    finally:
+        await _client.aclose()
+
+
+app = FastAPI(title="GHL LangGraph Agent (sticky router)", lifespan=lifespan)
+
+
+# Per-connection headers (RFC 9110 7.6.1) and ones httpx recomputes for the new message
+_HOP_BY_HOP = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade", "host", "content-length", "content-encoding",
+})
+
+
+def _end_to_end(items: Iterable[Tuple[str, str]], connection: str) -> List[Tuple[str, str]]:
+    """Headers to pass through: all but hop-by-hop ones and those named in Connection."""
+    named = {h.strip().lower() for h in connection.split(",")}
+    return [(k, v) for k, v in items if k.lower() not in _HOP_BY_HOP and k.lower() not in named]
+
+
+def _request_headers(req: Request, drop: Iterable[str] = ()) -> List[Tuple[str, str]]:
+    skip = {"x-forwarded-for", *drop}
+    headers = [
+        (k, v) for k, v in _end_to_end(req.headers.items(), req.headers.get("connection", ""))
+        if k.lower() not in skip
+    ]
+    if req.client is not None:
+        prior = req.headers.get("x-forwarded-for")
+        host = req.client.host
+        headers.append(("x-forwarded-for", f"{prior}, {host}" if prior else host))
+    return headers
+
+
+async def _forward(port: int, req: Request, body: bytes) -> Response:
+    assert _client is not None
+    headers = _request_headers(req)
+    resp = await _client.request(
+        req.method,
+        f"http://127.0.0.1:{port}{req.url.path}",
+        params=req.query_params,
+        content=body,
+        headers=headers,
+    )
+    out = Response(resp.content, status_code=resp.status_code)
+    # multi_items keeps repeated headers (Set-Cookie) apart
+    for k, v in _end_to_end(resp.headers.multi_items(), resp.headers.get("connection", "")):
+        out.headers.append(k, v)
+    return out
+
+
+@app.get("/health")
+async def health() -> Response:
+    return Response(b'{"status":"ok"}', media_type="application/json")
+
+
+@app.get("/ready")
+async def ready() -> Response:
+    assert _client is not None
+    ports = worker_ports()
+
+    async def probe(port: int) -> bool:
+        try:
+            r = await _client.get(f"http://127.0.0.1:{port}/ready", timeout=2.0)
+            return r.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    ok = all(await asyncio.gather(*(probe(p) for p in ports))) if ports else False
+    body = b'{"status":"ready"}' if ok else b'{"status":"warming"}'
+    return Response(body, status_code=200 if ok else 503, media_type="application/json")
+
+
+def _json(status_code: int, body: Dict[str, Any]) -> Response:
+    return Response(orjson.dumps(body), status_code=status_code, media_type="application/json")
+
+
+async def _forward_events(port: int, req: Request, events: List[bytes]) -> List[Dict[str, Any]]:
+    """Send ``events`` to one worker as an NDJSON batch; its per-event results, in order."""
+    assert _client is not None
+    headers = _request_headers(req, drop=("content-type",))
+    headers.append(("content-type", "application/x-ndjson"))
+    try:
+        resp = await _client.post(
+            f"http://127.0.0.1:{port}{req.url.path}",
+            params=req.query_params,
+            content=b"\n".join(events),
+            headers=headers,
+        )
+        if resp.status_code == 200:
+            results: List[Dict[str, Any]] = resp.json()["results"]
+            if len(results) == len(events):
+                return results
+            failed = {"status_code": 502, "detail": "Worker returned a short batch"}
+        else:
+            try:
+                detail = resp.json().get("detail")
+            except (ValueError, AttributeError):
+                detail = resp.text[:200]
+            failed = {"status_code": resp.status_code, "detail": detail}
+    except httpx.HTTPError as e:
+        failed = {"status_code": 502, "detail": f"Worker unreachable: {type(e).__name__}"}
+    return [dict(failed) for _ in events]
+
+
+@app.post("/webhooks/ghl/batch")
+async def route_batch(req: Request) -> Response:
+    """
+    Split a batch by contact: each worker gets the events of the contacts it owns, as one
+    NDJSON batch in request order, and the per-event results are merged back into request
+    order. Events that fail validation go to the first worker, which answers their 400.
+    """
+    body = await req.body()
+    ports = worker_ports()
+    try:
+        events = [e async for e in iter_events(req)]
+    except HTTPException as e:
+        return _json(e.status_code, {"detail": e.detail})
+    if len(events) > BATCH_MAX_EVENTS:
+        return _json(413, {"detail": f"More than {BATCH_MAX_EVENTS} events"})
+    groups: Dict[int, List[int]] = {}
+    for i, raw in enumerate(events):
+        try:
+            contact_id = GhlWebhook.model_validate_json(raw).contact_id
+        except ValidationError:
+            contact_id = None
+        groups.setdefault(pick_worker(contact_id, len(ports)), []).append(i)
+    if len(groups) <= 1:
+        # One worker owns the whole batch: pass it through untouched
+        return await _forward(ports[next(iter(groups), 0)], req, body)
+    parts = await asyncio.gather(*(
+        _forward_events(ports[w], req, [events[i] for i in idx]) for w, idx in groups.items()
+    ))
+    results: List[Dict[str, Any]] = [{} for _ in events]
+    for idx, part in zip(groups.values(), parts):
+        for i, result in zip(idx, part):
+            results[i] = result
+    return _json(200, {"count": len(results), "results": results})
+
+
+@app.api_route("/webhooks/{path:path}", methods=["POST"])
+async def route_webhook(path: str, req: Request) -> Response:
+    body = await req.body()
+    ports = worker_ports()
+    try:
+        contact_id = GhlWebhook.model_validate_json(body).contact_id
+    except ValidationError:
+        contact_id = None  # let the worker produce the 400
+    return await _forward(ports[pick_worker(contact_id, len(ports))], req, body)
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"])
+async def route_other(path: str, req: Request) -> Response:
+    # One fixed worker, so state kept per process (e.g. campaigns started over the API)
+    # is found again by later requests
+    return await _forward(worker_ports()[0], req, await req.body())
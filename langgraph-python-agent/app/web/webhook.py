@@ -1,113 +1,425 @@
 from __future__ import annotations
 
+import asyncio
+import logging
 import os
-from typing import Any, Dict, Optional, Literal
+import re
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional
 
-from fastapi import FastAPI, HTTPException, Request
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import ValidationError
 
-from app.graph.graph import build_graph
-from app.core.state import State
+from app.campaign.runner import CAMPAIGN_CONCURRENCY, CAMPAIGN_DIR, CAMPAIGN_RATE, Campaign
+from app.core import metrics, tracing
+from app.core.state import CRM, NLP, Planner
+from app.core.store import contact_lock, get_store
+from app.graph.compiled import get_graph, shutdown, warm_up
+from app.graph.overload import DEFER, overload
+from app.replay import recorder
+from app.tools import retries
+from app.tools.tenants import use_location
+from app.web import profiling
+from app.web.batch import OrderedBatch, Outcome, iter_events
+from app.web.lifecycle import claim, lifecycle, save
+from app.web.events import route_event
+from app.web.schema import GhlWebhook, normalize_channel
 
-app = FastAPI(title="GHL LangGraph Agent")
+logger = logging.getLogger(__name__)
 
-# Build the compiled graph lazily to allow server start without provider keys set
-_graph = None
+# GHL redelivers webhooks on timeouts; remember processed message ids this long
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
 
-def get_graph():
-    global _graph
-    if _graph is None:
-        _graph = build_graph()
-    return _graph
+
+# One graph run's inputs, as queued when deferred
+class _Run(NamedTuple):
+    contact_id: str
+    latest_text: str
+    channel: Optional[str]
+    conversation_id: Optional[str]
+    message_id: Optional[str]
+    location_id: Optional[str]
+
+
+# Non-urgent messages deferred at the DEFER overload level; beyond this many they are shed
+_deferred: asyncio.Queue[_Run] = asyncio.Queue(maxsize=int(os.getenv("OVERLOAD_DEFER_MAX", "1000")))
+
+# Set once the graph, LLM clients and GHL pool are warm; reported by /ready
+_ready = asyncio.Event()
+
+
+async def _warm() -> None:
+    try:
+        await warm_up()
+    except Exception:
+        # Keep serving: webhooks fall back to building the graph on first use
+        logger.exception("warm-up failed")
+    _ready.set()
+
+
+async def _resume_handoff() -> None:
+    """Run the work a previous instance handed off while draining (app/web/lifecycle.py)."""
+    await _ready.wait()
+    runs: List[asyncio.Task[Any]] = []
+    for record in claim():
+        run = _Run(**record["run"])
+        if record.get("kind") == "deferred" and not _deferred.full():
+            _deferred.put_nowait(run)
+        else:
+            runs.append(asyncio.create_task(_run_graph(run)))
+    for result in await asyncio.gather(*runs, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error("resumed run failed: %r", result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    tracing.check_export()
+    # Warm in the background so /health answers while heavy imports run
+    task = asyncio.create_task(_warm())
+    drain = asyncio.create_task(_drain_deferred())
+    resume = asyncio.create_task(_resume_handoff())
+    # SIGTERM drains in-flight runs before uvicorn stops (see README "Deploys")
+    lifecycle.install(asyncio.get_running_loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+        drain.cancel()
+        resume.cancel()
+        # Campaigns save their progress when stopped; restart them with the same name to resume
+        for campaign in _campaigns.values():
+            campaign.stop()
+        await asyncio.gather(drain, resume, return_exceptions=True)
+        # Whatever is still running or queued goes to the next instance
+        lifecycle.hand_off()
+        deferred: List[_Run] = []
+        while not _deferred.empty():
+            deferred.append(_deferred.get_nowait())
+        save([{"kind": "deferred", "run": run._asdict()} for run in deferred])
+        await asyncio.sleep(0)  # let cancelled runs release their contact locks
+        await shutdown()
+        if tracing.EXPORT_LANGSMITH:
+            # Ship kept traces still waiting for the exporter thread
+            await asyncio.to_thread(tracing.flush)
+
+
+app = FastAPI(title="GHL LangGraph Agent", lifespan=lifespan)
 
 
 def _extract_payload(body: Dict[str, Any]) -> Dict[str, Optional[str]]:
     """
     Normalize common Go High Level (LeadConnector) webhook shapes to our State fields.
-    This is a best-effort mapper; adjust keys to your exact webhook configuration.
+    This is a best-effort mapper; adjust keys in app/web/schema.py to your webhook configuration.
     """
-    contact_id = (
-        body.get("contactId")
-        or (body.get("contact") or {}).get("id")
-        or (body.get("data") or {}).get("contactId")
-    )
-    text = (
-        (body.get("message") or {}).get("text")
-        or body.get("body")
-        or (body.get("data") or {}).get("body")
-    )
-    channel = body.get("channel") or (body.get("data") or {}).get("channel") or "sms"
-    conversation_id = (
-        body.get("conversationId")
-        or (body.get("conversation") or {}).get("id")
-        or (body.get("data") or {}).get("conversationId")
-    )
+    return GhlWebhook.model_validate(body).fields()
+
+
+def _summary(raw: Any) -> Dict[str, Any]:
+    # LangGraph returns channel values (already State sub-models); read them directly
+    # instead of re-validating the whole State
+    if isinstance(raw, dict):
+        planner, nlp, booking = raw["planner"], raw["nlp"], raw["booking"]
+    else:
+        planner, nlp, booking = raw.planner, raw.nlp, raw.booking
     return {
-        "contact_id": contact_id,
-        "latest_text": text,
-        "channel": channel,
-        "conversation_id": conversation_id,
+        "status": "ok",
+        "next_action": planner.next_action,
+        "language": nlp.language,
+        "intent": nlp.intent,
+        "appointment_id": booking.appointment_id,
     }
 
 
+def _json(payload: Dict[str, Any], status_code: int = 200) -> Response:
+    # Encode with orjson directly instead of FastAPI's jsonable_encoder round-trip
+    return Response(orjson.dumps(payload), status_code=status_code, media_type="application/json")
+
+
 @app.get("/health")
 async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
-@app.post("/webhooks/ghl")
-async def handle_ghl(req: Request):
-    try:
-        body = await req.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON")
+@app.get("/ready")
+async def ready() -> Response:
+    if lifecycle.draining:
+        return _json({"status": "draining"}, status_code=503)
+    if not _ready.is_set():
+        return _json({"status": "warming"}, status_code=503)
+    return _json({"status": "ready"})
+
+
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    return metrics.snapshot()
+
+
+async def process_webhook(hook: GhlWebhook, graph: Any = None) -> Dict[str, Any]:
+    """
+    Route one decoded webhook and, for inbound messages, run the graph.
+
+    Shared by the HTTP handler and offline tools (replay); raises HTTPException for payloads
+    the handler should reject. ``graph`` defaults to the process-wide compiled graph.
+    """
+    # Receipts, echoes of our own sends and contact updates never reach the graph
+    action, event = await route_event(hook)
+    if action != "graph":
+        return {"status": "ignored" if action == "drop" else "handled", "event": event}
 
-    fields = _extract_payload(body or {})
+    fields = hook.fields()
     contact_id = fields["contact_id"]
     latest_text = fields["latest_text"]
-    channel = fields["channel"]
     conversation_id = fields["conversation_id"]
-
-    # Normalize channel to allowed literals
-    channel_map: dict[str, Literal["sms", "facebook", "instagram"]] = {
-        "sms": "sms",
-        "facebook": "facebook",
-        "fb": "facebook",
-        "instagram": "instagram",
-        "ig": "instagram",
-    }
-    chan: Optional[Literal["sms", "facebook", "instagram"]] = (
-        channel_map.get(str(channel).lower()) if channel else "sms"
-    )
+    chan = normalize_channel(fields["channel"])
 
     if not contact_id:
         raise HTTPException(status_code=400, detail="Missing contact_id")
+    message_id = hook.message_id
+    if message_id and not await get_store().aadd("idempotency", message_id, IDEMPOTENCY_TTL):
+        metrics.incr("webhook.duplicate")
+        return {"status": "duplicate", "event": event}
     if not latest_text:
         # Some webhook events may not carry text; allow but no-op routing
         latest_text = ""
 
-    state = State(
-        contact_id=str(contact_id),
-        latest_text=str(latest_text),
-        channel=chan,
-        conversation_id=str(conversation_id) if conversation_id else None,
-    )
-
-    # Use contact_id as thread key to preserve memory/checkpointing
-    graph = get_graph()
-    raw = await graph.ainvoke(
-        state,
-        config={
-            "configurable": {"thread_id": str(contact_id)},
-            "tags": [f"channel:{(chan or 'sms')}"],
-            "metadata": {"contact_id": str(contact_id)},
-        },
-    )
-    result: State = State.model_validate(raw) if isinstance(raw, dict) else raw
+    run = _Run(contact_id, latest_text, chan, conversation_id, message_id, fields["location_id"])
+    if overload.should_defer(latest_text):
+        try:
+            _deferred.put_nowait(run)
+        except asyncio.QueueFull:
+            # Shed: GHL redelivers on error, by which time load may have dropped
+            if message_id:
+                await get_store().adelete("idempotency", message_id)
+            metrics.incr("overload.shed")
+            raise HTTPException(status_code=503, detail="Overloaded", headers={"Retry-After": "30"})
+        metrics.incr("overload.deferred")
+        metrics.set_gauge("overload.deferred_depth", _deferred.qsize())
+        return {"status": "deferred", "event": event}
+    out = await _run_graph(run, graph)
+    if out is None:
+        # Still running at the drain deadline; the next instance finishes it
+        return {"status": "handed_off", "event": event}
+    return _summary(out)
 
-    return {
-        "status": "ok",
-        "next_action": result.planner.next_action,
-        "language": result.nlp.language,
-        "intent": result.nlp.intent,
-        "appointment_id": result.booking.appointment_id,
+
+async def _run_graph(run: _Run, graph: Any = None) -> Any:
+    """Run the graph for ``run``; returns None if it was handed off while draining."""
+    _done, out = await lifecycle.run({"kind": "run", "run": run._asdict()}, _invoke(run, graph))
+    return out
+
+
+async def _invoke(run: _Run, graph: Any = None) -> Any:
+    # Only this turn's fields: history, booking and meta carry over from the contact's
+    # checkpoint (a State instance would reset every field to its default)
+    state: Dict[str, Any] = {
+        "contact_id": run.contact_id,
+        "latest_text": run.latest_text,
+        "channel": run.channel,
+        "conversation_id": run.conversation_id,
+        "crm": CRM(location_id=run.location_id),
+        "nlp": NLP(),
+        "planner": Planner(),
     }
+
+    # Use contact_id as thread key to preserve memory/checkpointing; one run per contact
+    # at a time (across workers when the store is shared)
+    graph = graph or get_graph()
+    try:
+        async with contact_lock(run.contact_id):
+            # GHL calls and contact cache lookups go to the webhook's location. GHL retries
+            # stop at the run's deadline; writes are keyed by the inbound message so a
+            # redelivery doesn't repeat an SMS or appointment
+            with overload.track(), use_location(run.location_id), \
+                    retries.deadline(retries.WEBHOOK_DEADLINE_S), \
+                    retries.idempotency_scope(run.message_id):
+                with tracing.trace("webhook", contact_id=run.contact_id,
+                                   location_id=run.location_id, channel=run.channel) as tr:
+                    out = await graph.ainvoke(
+                        state,
+                        config={
+                            "configurable": {"thread_id": run.contact_id},
+                            "tags": [f"channel:{(run.channel or 'sms')}"],
+                            "metadata": {"contact_id": run.contact_id},
+                        },
+                    )
+                    if tr is not None:
+                        tr.outputs = _summary(out)
+                    return out
+    except BaseException:
+        # Let GHL's redelivery retry a run that didn't complete
+        if run.message_id:
+            await get_store().adelete("idempotency", run.message_id)
+        raise
+
+
+async def _drain_deferred() -> None:
+    """Run deferred messages once the overload controller has left the DEFER level."""
+    while True:
+        run = await _deferred.get()
+        try:
+            while overload.level() >= DEFER or lifecycle.draining:
+                await asyncio.sleep(1.0)
+        except asyncio.CancelledError:
+            _deferred.put_nowait(run)  # shutting down; handed off with the rest of the queue
+            raise
+        try:
+            await _run_graph(run)
+        except Exception:
+            logger.exception("deferred run failed for contact %s", run.contact_id)
+        metrics.set_gauge("overload.deferred_depth", _deferred.qsize())
+
+
+@app.post("/debug/profile")
+async def toggle_profile(req: Request) -> Response:
+    """Profile the next ``count`` webhooks: {"count": N} (0 turns it off)."""
+    if not profiling.authorized(req):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        count = int(orjson.loads(await req.body() or b"{}").get("count", 1))
+    except (orjson.JSONDecodeError, AttributeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    return _json({"remaining": profiling.enable(count)})
+
+
+@app.get("/debug/traces")
+async def get_traces(req: Request, limit: int = 20, min_ms: float = 0.0,
+                     reason: Optional[str] = None) -> Response:
+    """
+    Recent kept traces (slow, failed or sampled), newest first. Needs the same X-Profile
+    token as /debug/profile and is refused while PROFILE_TOKEN is unset.
+    """
+    if not profiling.authorized(req):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return _json({"traces": tracing.recent(max(1, min(limit, 200)), min_ms, reason)})
+
+
+# Outbound campaigns started over the API (app/campaign/runner.py), by name
+_campaigns: Dict[str, Campaign] = {}
+
+
+def _check_campaign_token(req: Request) -> None:
+    # Campaigns message thousands of contacts; the API is off unless CAMPAIGN_TOKEN is set
+    token = os.getenv("CAMPAIGN_TOKEN")
+    if not token or req.headers.get("x-campaign-token") != token:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.post("/campaigns")
+async def start_campaign(req: Request) -> Response:
+    """
+    Start a campaign: {"name", "source": "ghl" | file in CAMPAIGN_DIR, or "contacts": [ids],
+    "location_id", "concurrency", "rate", "message", "channel"}.
+    """
+    _check_campaign_token(req)
+    try:
+        body = orjson.loads(await req.body())
+        name = str(body["name"])
+        if not re.fullmatch(r"[A-Za-z0-9_.-]{1,64}", name) or name.startswith("."):
+            raise HTTPException(status_code=400, detail="Invalid campaign name")
+        source: Any = body.get("contacts")
+        if source is None:
+            source = str(body.get("source") or "ghl")
+            if source != "ghl":
+                # Only files inside CAMPAIGN_DIR
+                source = os.path.join(CAMPAIGN_DIR, os.path.basename(source))
+        if normalize_channel(str(body.get("channel") or "sms")) is None:
+            raise HTTPException(status_code=400, detail="Invalid channel")
+        campaign = Campaign(
+            name,
+            source,
+            location_id=body.get("location_id"),
+            concurrency=int(body.get("concurrency") or CAMPAIGN_CONCURRENCY),
+            rate=float(body.get("rate") or CAMPAIGN_RATE),
+            message=body.get("message"),
+            channel=str(body.get("channel") or "sms"),
+        )
+    except (orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid campaign")
+    if isinstance(source, str) and source != "ghl" and not os.path.exists(source):
+        raise HTTPException(status_code=400, detail="Source file not found")
+    running = _campaigns.get(name)
+    if running is not None and running.task is not None and not running.task.done():
+        raise HTTPException(status_code=409, detail="Campaign already running")
+    _campaigns[name] = campaign
+    campaign.start()
+    return _json(campaign.status(), status_code=202)
+
+
+@app.get("/campaigns")
+async def list_campaigns(req: Request) -> Response:
+    _check_campaign_token(req)
+    return _json({"campaigns": [c.status() for c in _campaigns.values()]})
+
+
+@app.get("/campaigns/{name}")
+async def get_campaign(name: str, req: Request) -> Response:
+    _check_campaign_token(req)
+    campaign = _campaigns.get(name)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Unknown campaign")
+    return _json(campaign.status())
+
+
+@app.post("/campaigns/{name}/stop")
+async def stop_campaign(name: str, req: Request) -> Response:
+    _check_campaign_token(req)
+    campaign = _campaigns.get(name)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Unknown campaign")
+    campaign.stop()
+    return _json({"name": name, "stopping": True})
+
+
+def _decode(body: bytes) -> GhlWebhook:
+    # Decode and validate in a single pass (pydantic-core JSON parser)
+    try:
+        return GhlWebhook.model_validate_json(body)
+    except ValidationError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+
+async def _handle(body: bytes, hook: GhlWebhook) -> Dict[str, Any]:
+    with recorder.recording(body) as rec:
+        result = await process_webhook(hook)
+        rec["result"] = result
+    return result
+
+
+@app.post("/webhooks/ghl")
+async def handle_ghl(req: Request) -> Response:
+    # No-op unless profiling was requested (X-Profile header, toggle or sampling)
+    async with profiling.maybe_profile(req):
+        body = await req.body()
+        return _json(await _handle(body, _decode(body)))
+
+
+async def _batch_event(body: bytes, hook: GhlWebhook) -> Outcome:
+    return 200, await _handle(body, hook)
+
+
+@app.post("/webhooks/ghl/batch")
+async def handle_ghl_batch(req: Request) -> Response:
+    """
+    Many webhook events in one request, as a JSON array or NDJSON. Each event is validated,
+    deduplicated and processed like a single POST /webhooks/ghl; the response lists each
+    event's status code and body in request order. A contact's events run in order only
+    within one request: separate batches (or single webhooks) for the same contact may
+    interleave, serialized per run by contact_lock but not ordered.
+    """
+    async with profiling.maybe_profile(req):
+        batch = OrderedBatch(_batch_event)
+        try:
+            async for body in iter_events(req):
+                try:
+                    hook = _decode(body)
+                except HTTPException as e:
+                    batch.add_outcome((e.status_code, {"detail": e.detail}))
+                    continue
+                batch.add(body, hook, hook.fields()["contact_id"])
+        except BaseException:
+            batch.cancel()
+            raise
+        results = await batch.results()
+        return _json({"count": len(results), "results": results})
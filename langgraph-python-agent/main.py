@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import argparse
 import os
+import subprocess
+import sys
 
 from dotenv import load_dotenv
 
@@ -11,9 +14,60 @@ load_dotenv()
 # - Exposes /health and /webhooks/ghl
 from app.web.webhook import app  # noqa: E402
 
+
+def _run_sticky(host: str, port: int, workers: int) -> None:
+    """Spawn N single-process workers on port+1..port+N and a hashing router on port."""
+    import uvicorn
+
+    ports = [port + 1 + i for i in range(workers)]
+    procs = []
+    for i, p in enumerate(ports):
+        env = dict(os.environ, WORKER_INDEX=str(i))
+        procs.append(
+            subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.web.webhook:app",
+                 "--host", "127.0.0.1", "--port", str(p)],
+                env=env,
+            )
+        )
+    os.environ["WORKER_PORTS"] = ",".join(str(p) for p in ports)
+    try:
+        uvicorn.run("app.web.sticky:app", host=host, port=port)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
 if __name__ == "__main__":
-    # Local dev server
     import uvicorn
 
-    port = int(os.getenv("PORT", "8000"))
-    uvicorn.run("app.web.webhook:app", host="127.0.0.1", port=port, reload=True)
+    parser = argparse.ArgumentParser(description="Run the GHL agent webhook server")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WORKERS", "1")),
+        help="worker processes; >1 needs STORE_BACKEND=sqlite (the default when unset)",
+    )
+    parser.add_argument(
+        "--sticky", action="store_true", default=os.getenv("STICKY_WORKERS") == "1",
+        help="route each contact to a fixed worker (hash of contact id)",
+    )
+    args = parser.parse_args()
+
+    if args.workers <= 1:
+        # Local dev server
+        uvicorn.run("app.web.webhook:app", host=args.host, port=args.port, reload=True)
+    else:
+        # Checkpoints, locks, idempotency keys and caches must be shared across processes;
+        # per-process memory stores would silently double-send and lose history
+        backend = (os.getenv("STORE_BACKEND") or "sqlite").lower()
+        if backend != "sqlite":
+            parser.error(f"--workers {args.workers} needs STORE_BACKEND=sqlite (got {backend!r})")
+        os.environ["STORE_BACKEND"] = backend
+        if args.sticky:
+            _run_sticky(args.host, args.port, args.workers)
+        else:
+            uvicorn.run("app.web.webhook:app", host=args.host, port=args.port,
+                        workers=args.workers)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark of checkpoint size and per-transition overhead for the agent State.
+
+Compares LangGraph's stock JsonPlusSerializer with app.graph.serde.StateSerializer:
+  1. bytes per checkpoint and dumps+loads time for a realistic State
+  2. wall/CPU time per node transition running the offline graph against a fake GHL,
+     as the median of several interleaved runs after one warm-up run per serializer
+
+Usage: python scripts/bench_state.py [turns] [repeats]
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.pop("OPENAI_API_KEY", None)  # offline LLM fallbacks
+
+from langgraph.checkpoint.memory import MemorySaver  # noqa: E402
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer  # noqa: E402
+
+from app.core.state import CRM, NLP, Booking, Planner, State, Turn  # noqa: E402
+from app.graph import graph as graph_module  # noqa: E402
+from app.graph.serde import StateSerializer  # noqa: E402
+from app.tools.cache import contact_cache  # noqa: E402
+
+NODES_PER_TURN = 4  # fetch_crm -> classify -> plan -> respond
+
+
+class FakeGhl:
+    async def get_contact(self, contact_id: str) -> Dict[str, Any]:
+        return {"id": contact_id, "tags": [{"name": "lead"}, {"name": "Spanish"}]}
+
+    async def send_message(
+        self, contact_id: str, text: str, channel: str = "sms"
+    ) -> Dict[str, Any]:
+        return {"messageId": "m1"}
+
+    async def assign_tags(self, contact_id: str, tag_names: List[str]) -> Dict[str, Any]:
+        return {}
+
+    async def list_calendars(self, location_id: str) -> Dict[str, Any]:
+        return {"data": []}
+
+
+def sample_state(turns: int) -> State:
+    return State(
+        contact_id="contact_abc",
+        conversation_id="conv_xyz",
+        latest_text="Hola, quiero saber el precio del paquete",
+        channel="sms",
+        crm=CRM(tags=["lead", "Spanish", "intent:price"], location_id="loc_123"),
+        nlp=NLP(language="es", intent="price", priority=3, sentiment="neu"),
+        planner=Planner(next_action="done", rationale="routed_by_intent:price"),
+        booking=Booking(),
+        history=[
+            Turn(role="user" if i % 2 == 0 else "assistant", content=f"mensaje numero {i} " * 6)
+            for i in range(turns)
+        ],
+    )
+
+
+def checkpoint_bytes(serde: Any, state: State, n: int = 2000) -> tuple[int, float]:
+    # LangGraph stores one blob per channel; mirror that
+    values = {k: getattr(state, k) for k in State.model_fields}
+    blobs = {k: serde.dumps_typed(v) for k, v in values.items()}
+    size = sum(len(b[1]) for b in blobs.values())
+    start = time.perf_counter()
+    for _ in range(n):
+        for k, v in values.items():
+            serde.loads_typed(serde.dumps_typed(v))
+    return size, (time.perf_counter() - start) / n * 1e6
+
+
+async def transitions(serde: Any, turns: int) -> tuple[float, float]:
+    graph_module.GhlClient = FakeGhl  # type: ignore[assignment,misc]
+    graph = graph_module.build_graph(checkpointer=MemorySaver(serde=serde))
+    contact_cache.clear()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for i in range(turns):
+        state = State(contact_id=f"c{i % 20}", latest_text="hola, precio?", channel="sms")
+        await graph.ainvoke(state, config={"configurable": {"thread_id": f"c{i % 20}"}})
+    n = turns * NODES_PER_TURN
+    return (time.perf_counter() - wall) / n * 1e6, (time.process_time() - cpu) / n * 1e6
+
+
+def main() -> None:
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    state = sample_state(turns)
+    serdes = {"jsonplus": JsonPlusSerializer(), "state-msgpack": StateSerializer()}
+    runs: Dict[str, List[tuple[float, float]]] = {name: [] for name in serdes}
+    for serde in serdes.values():
+        asyncio.run(transitions(serde, 100))  # warm-up
+    # Interleave runs so drift (thermal, other load) hits both serializers alike
+    for _ in range(repeats):
+        for name, serde in serdes.items():
+            runs[name].append(asyncio.run(transitions(serde, 400)))
+    for name, serde in serdes.items():
+        size, rt = checkpoint_bytes(serde, state)
+        wall = statistics.median(r[0] for r in runs[name])
+        cpu = [r[1] for r in runs[name]]
+        print(
+            f"{name:14s} bytes/checkpoint={size:6d}  dumps+loads={rt:7.1f}us  "
+            f"per-transition wall={wall:6.1f}us cpu={statistics.median(cpu):6.1f}us "
+            f"(min {min(cpu):.1f} max {max(cpu):.1f}, n={repeats})"
+        )
+
+
+if __name__ == "__main__":
+    main()
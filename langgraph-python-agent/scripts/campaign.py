@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Run an outbound re-engagement campaign through the campaign graph.
+
+Targets come from a file (JSONL contacts as written by contacts_sync.py export, or one
+contact id per line) or from GHL (--source ghl: every contact of --location-id). Progress
+is checkpointed under CAMPAIGN_DIR; rerunning the same --name resumes where it stopped.
+
+Usage:
+  python scripts/campaign.py --name spring --source contacts.jsonl [--concurrency 16] [--rate 20]
+  python scripts/campaign.py --name spring --source ghl --location-id LOC --message "Hi!"
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()
+
+from app.campaign.runner import CAMPAIGN_CONCURRENCY, CAMPAIGN_RATE, Campaign  # noqa: E402
+from app.tools.tenants import registry  # noqa: E402
+from app.web.schema import CHANNEL_MAP  # noqa: E402
+
+
+def _print(status: Dict[str, Any]) -> None:
+    print(
+        f"[{status['state']}] done={status['done']} sent={status['sent']} "
+        f"skipped={status['skipped']} failed={status['failed']} "
+        f"previously_done={status['previously_done']} {status['per_s']}/s "
+        f"elapsed={status['elapsed_s']}s paused={status['paused_s']}s",
+        file=sys.stderr,
+    )
+
+
+async def run(args: argparse.Namespace) -> int:
+    campaign = Campaign(
+        args.name,
+        args.source,
+        location_id=args.location_id,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        message=args.message,
+        channel=args.channel,
+    )
+    try:
+        status = await campaign.run(report=_print, report_every=args.report_every)
+    finally:
+        await registry.aclose()
+    return 0 if status["state"] == "done" else 1
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--name", required=True, help="campaign name (tag campaign:<name>, checkpoint)"
+    )
+    parser.add_argument("--source", required=True, help="'ghl' or a JSONL/id-per-line file")
+    parser.add_argument("--location-id", default=os.getenv("GHL_LOCATION_ID"))
+    parser.add_argument("--concurrency", type=int, default=CAMPAIGN_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=CAMPAIGN_RATE, help="contacts/s per location")
+    parser.add_argument(
+        "--message", default=None, help="fixed template ({first_name}); default: model-written"
+    )
+    parser.add_argument("--channel", default="sms", type=str.lower, choices=sorted(CHANNEL_MAP))
+    parser.add_argument(
+        "--report-every", type=float, default=5.0, help="seconds between progress lines"
+    )
+    args = parser.parse_args()
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("stopped; rerun with the same --name to resume", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Stream every contact of a location from GHL.
+
+  export  write contacts as JSONL (one contact per line)
+  warm    load contacts into the contact cache (use STORE_BACKEND=sqlite so the running
+          webhook workers share it; tags are read from the cached contact by fetch_crm)
+
+Both resume from --checkpoint if it exists, right after the last contact written or cached.
+
+Usage:
+  python scripts/contacts_sync.py export --out contacts.jsonl [--checkpoint export.ckpt]
+  python scripts/contacts_sync.py warm [--checkpoint warm.ckpt]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Any
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import orjson  # noqa: E402
+from dotenv import load_dotenv  # noqa: E402
+
+load_dotenv()  # before app imports: STORE_BACKEND decides the cache type
+
+from app.core.store import backend  # noqa: E402
+from app.tools.contacts import iter_contacts  # noqa: E402
+from app.tools.tenants import registry  # noqa: E402
+
+
+def _open_export(path: str) -> Any:
+    """Open the JSONL output for appending, dropping a line cut short by an earlier crash."""
+    out = open(path, "ab+")
+    size = out.seek(0, os.SEEK_END)
+    if size:
+        out.seek(max(0, size - 65536))
+        tail = out.read()
+        if not tail.endswith(b"\n"):
+            out.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+    out.seek(0, os.SEEK_END)
+    return out
+
+
+async def run(args: argparse.Namespace) -> int:
+    # The location's own client, rate budget and contact cache namespace
+    tenant = registry.get(args.location_id)
+    ghl = tenant.client
+    out = _open_export(args.out) if args.cmd == "export" else None
+    count = 0
+    start = time.perf_counter()
+    try:
+        async for contact in iter_contacts(
+            ghl,
+            location_id=args.location_id,
+            page_size=args.page_size,
+            prefetch=args.prefetch,
+            checkpoint_path=args.checkpoint,
+        ):
+            if out is not None:
+                out.write(orjson.dumps(contact) + b"\n")
+                # On disk before iter_contacts checkpoints past this contact
+                out.flush()
+            elif contact.get("id"):
+                await tenant.contacts.aset(str(contact["id"]), contact)
+            count += 1
+            if count % 1000 == 0:
+                rate = count / (time.perf_counter() - start)
+                print(f"{count} contacts ({rate:.0f}/s)", file=sys.stderr)
+    finally:
+        if out is not None:
+            out.close()
+        await ghl.aclose()
+    elapsed = time.perf_counter() - start
+    print(f"done: {count} contacts in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f}/s)")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cmd", choices=["export", "warm"])
+    parser.add_argument("--out", default="contacts.jsonl")
+    parser.add_argument("--location-id", default=os.getenv("GHL_LOCATION_ID"))
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--prefetch", type=int, default=4, help="pages in flight")
+    parser.add_argument("--checkpoint", default=None, help="resume file")
+    args = parser.parse_args()
+    if args.cmd == "warm" and backend() == "memory":
+        print("warm: STORE_BACKEND=memory would discard the cache on exit; set "
+              "STORE_BACKEND=sqlite to share it with the webhook workers", file=sys.stderr)
+        return 1
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
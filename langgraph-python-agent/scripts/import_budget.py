@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Measure cold-start cost and fail if it exceeds the budget.
+
+Each phase runs in a fresh interpreter so module caches don't hide import cost:
+  import  — `import app.web.webhook` (what uvicorn pays before binding the port)
+  warm    — import + warm_up() (graph compile, LLM clients, GHL pool) = time to /ready
+
+Budgets (ms) come from IMPORT_BUDGET_MS and WARM_BUDGET_MS.
+Usage: python scripts/import_budget.py
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+IMPORT_SNIPPET = """
+import time
+t = time.perf_counter()
+import app.web.webhook
+print((time.perf_counter() - t) * 1000)
+"""
+
+WARM_SNIPPET = """
+import asyncio, time
+t = time.perf_counter()
+import app.web.webhook
+from app.graph.compiled import warm_up
+asyncio.run(warm_up())
+print((time.perf_counter() - t) * 1000)
+"""
+
+
+def measure(snippet: str, runs: int = 3) -> float:
+    env = dict(os.environ, PYTHONPATH=ROOT, GHL_WARM="0")
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", snippet], cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            print(out.stderr, file=sys.stderr)
+            raise SystemExit(2)
+        samples.append(float(out.stdout.strip().splitlines()[-1]))
+    return min(samples)
+
+
+def main() -> int:
+    import_budget = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+    warm_budget = float(os.getenv("WARM_BUDGET_MS", "6000"))
+    import_ms = measure(IMPORT_SNIPPET)
+    warm_ms = measure(WARM_SNIPPET)
+    ok = import_ms <= import_budget and warm_ms <= warm_budget
+    print(f"import app.web.webhook: {import_ms:7.1f} ms (budget {import_budget:.0f})")
+    print(f"import + warm_up:       {warm_ms:7.1f} ms (budget {warm_budget:.0f})")
+    print("OK" if ok else "OVER BUDGET")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
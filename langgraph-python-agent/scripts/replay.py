@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Replay recorded webhook traffic offline.
+
+Cassettes are written by the webhook when RECORD_DIR is set (see app/replay/recorder.py).
+Entries run through process_webhook against a fresh graph whose GHL client and LLMs answer
+from the cassette, so no network calls are made. Compare against an earlier run's report to
+spot routing changes and latency regressions.
+
+Usage:
+  python scripts/replay.py cassettes/ [--speed 50] [--concurrency 8] [--out run.json]
+  python scripts/replay.py cassettes/ --baseline run.json [--regression-pct 20]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# Offline: never record the replay itself, never share state with a running server
+os.environ.pop("RECORD_DIR", None)
+os.environ["STORE_BACKEND"] = "memory"
+# Cassettes hold per-message classify labels, replayed through the unbatched path
+os.environ["CLASSIFY_BATCH_WINDOW_MS"] = "0"
+# No degradation: replay compares full-path decisions (and has no deferred-queue drain)
+os.environ["OVERLOAD_INFLIGHT"] = "0"
+os.environ.setdefault("GHL_API_KEY", "replay")
+
+import orjson  # noqa: E402
+
+from app.replay.replayer import (  # noqa: E402
+    diff_runs,
+    iter_report_lines,
+    load_cassettes,
+    replay,
+    summarize,
+)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("cassettes", nargs="+", help="cassette files or directories")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="time compression of recorded gaps (0 = as fast as possible)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--out", default=None, help="write per-entry results as JSON")
+    parser.add_argument("--baseline", default=None, help="earlier --out file to diff against")
+    parser.add_argument("--regression-pct", type=float, default=20.0)
+    args = parser.parse_args()
+
+    entries = load_cassettes(args.cassettes)
+    if not entries:
+        print("no cassette entries found", file=sys.stderr)
+        return 1
+    rows = asyncio.run(replay(entries, speed=args.speed, concurrency=args.concurrency))
+
+    diff = None
+    if args.baseline:
+        with open(args.baseline, "rb") as f:
+            diff = diff_runs(rows, orjson.loads(f.read()), args.regression_pct)
+    for line in iter_report_lines(summarize(rows), diff):
+        print(line)
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(orjson.dumps(rows, option=orjson.OPT_INDENT_2))
+    if diff and (diff["decision_changes"] or diff["latency_regressions"]):
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
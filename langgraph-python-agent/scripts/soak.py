@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+"""
+Soak test: drive the webhook app in-process for many simulated turns and fail on leaks.
+
+Webhooks go through the full ASGI app (lifespan, dedupe, scheduler, graph, checkpointer)
+via httpx.ASGITransport. GHL is a fake HTTP server on a local port, so the pooled GHL
+clients open real sockets; the chat models are fakes that answer classify and respond
+prompts. Contacts follow a sliding window: new leads keep arriving, recent ones write
+most, and older ones occasionally come back.
+
+Every --interval seconds RSS, open file descriptors and sockets, and asyncio task counts
+are sampled; after --warmup turns tracemalloc also starts, adding the traced heap and its
+top growing allocation sites. The growth of each series after the warm-up (per 100k turns,
+first vs last third of the samples) must stay under its --max-* limit, else the run fails
+with exit code 2; any webhook answered with a non-200 status fails it with exit code 3.
+Store TTLs are shortened to --ttl seconds so caches reach their steady state within the
+warm-up; whatever still grows is being kept by reference. The --locations
+fake locations are listed in a temporary GHL_LOCATIONS_FILE, so each gets its own tenant
+(client, rate budget, caches) and tenant eviction is exercised too.
+
+Usage:
+  python scripts/soak.py [--turns 1000000] [--contacts 20000] [--concurrency 32]
+  python scripts/soak.py --turns 50000 --warmup 10000 --out soak.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import orjson  # noqa: E402
+from fastapi import FastAPI, Request, Response  # noqa: E402
+
+# Inbound texts; one in four asks to book, one in four is Spanish
+MESSAGES = [
+    "Hi, I saw your ad. What do you offer?",
+    "How much is the monthly package?",
+    "We want more leads for our dental clinic",
+    "Can you book me a call tomorrow afternoon?",
+    "Not interested right now, thanks",
+    "Do you work with restaurants?",
+    "Hola, quiero saber el precio del paquete",
+    "Hola, ¿pueden agendar una llamada esta semana?",
+]
+
+# Soak limits, in growth per 100k turns after the warm-up
+LIMITS = {"rss_mb": 16.0, "heap_mb": 4.0, "fds": 10.0, "sockets": 10.0, "tasks": 10.0}
+
+
+class FakeLLM:
+    """Chat model stand-in: JSON labels for classify prompts, a canned reply otherwise."""
+
+    def __init__(self, latency_ms: float) -> None:
+        self.latency = latency_ms / 1000.0
+
+    @staticmethod
+    def _labels(text: str) -> Dict[str, Any]:
+        t = text.lower()
+        spanish = any(w in t for w in ("hola", "precio", "agendar", "quiero"))
+        if any(w in t for w in ("book", "agendar", "call")):
+            intent = "book"
+        elif any(w in t for w in ("how much", "precio", "price")):
+            intent = "price"
+        elif "not interested" in t:
+            intent = "out_of_scope"
+        else:
+            intent = "qualify"
+        language = "es" if spanish else "en"
+        return {"language": language, "intent": intent, "priority": 3, "sentiment": "neu"}
+
+    async def ainvoke(self, messages: Any, *args: Any, **kwargs: Any) -> Any:
+        from langchain_core.messages import AIMessage
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        prompt = str(messages[-1].content)
+        if prompt.startswith("You are a classifier"):
+            if "\nmessages: " in prompt:
+                batch = orjson.loads(prompt.rsplit("\nmessages: ", 1)[1])
+                results = [{"i": m["i"], **self._labels(m["text"])} for m in batch]
+                return AIMessage(content=orjson.dumps({"results": results}).decode())
+            labels = self._labels(prompt.rsplit("last_message:", 1)[-1])
+            return AIMessage(content=orjson.dumps(labels).decode())
+        return AIMessage(
+            content="Thanks! What's your main goal right now, and would a quick call tomorrow work?"
+        )
+
+
+class FakeGhl:
+    """
+    GHL API stand-in served by uvicorn on a background thread. Conversations are message
+    counters (LRU-capped, so the fake's own memory stays flat).
+    """
+
+    def __init__(self, latency_ms: float, max_conversations: int) -> None:
+        self.latency = latency_ms / 1000.0
+        self.max_conversations = max_conversations
+        self.conversations: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        headers = {"x-ratelimit-remaining": "1000", "x-ratelimit-interval-milliseconds": "10000"}
+        app = FastAPI()
+
+        @app.api_route("/{path:path}", methods=["GET", "POST"])
+        async def any_route(path: str, req: Request) -> Response:
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            body = await self._answer(path.strip("/").split("/"), req)
+            return Response(orjson.dumps(body), media_type="application/json", headers=headers)
+
+        self.app = app
+        self.server: Any = None
+
+    def add_message(self, conversation_id: str) -> int:
+        with self._lock:
+            n = self.conversations.pop(conversation_id, 0) + 1
+            self.conversations[conversation_id] = n
+            if len(self.conversations) > self.max_conversations:
+                self.conversations.popitem(last=False)
+            return n
+
+    async def _answer(self, parts: List[str], req: Request) -> Dict[str, Any]:
+        if parts[0] == "contacts" and len(parts) == 2 and req.method == "GET":
+            cid = parts[1]
+            tags = ["spanish"] if cid.endswith("7") else []
+            return {"id": cid, "firstName": f"Lead{cid[-3:]}", "tags": tags}
+        if parts[0] == "conversations" and parts[-1] == "messages":
+            if req.method == "POST":
+                contact = orjson.loads(await req.body()).get("contactId", "")
+                n = self.add_message(f"conv-{contact}")
+                return {"messageId": f"out-{contact}-{n}", "conversationId": f"conv-{contact}"}
+            conv = parts[1]
+            with self._lock:
+                n = self.conversations.get(conv, 0)
+            limit = int(req.query_params.get("limit", "20"))
+            last = req.query_params.get("lastMessageId")
+            top = int(last.rsplit("-", 1)[1]) - 1 if last else n
+            ids = list(range(top, max(0, top - limit), -1))
+            items = [{"id": f"{conv}-{k}", "body": f"message {k}",
+                      "direction": "inbound" if k % 2 else "outbound"} for k in ids]
+            return {"messages": {"messages": items, "nextPage": bool(ids) and ids[-1] > 1,
+                                 "lastMessageId": items[-1]["id"] if items else None}}
+        if parts[0] == "locations" and parts[-1] == "calendars":
+            return {"data": [{"id": f"cal-{parts[1]}"}]}
+        if parts[0] == "appointments":
+            return {"id": f"appt-{random.getrandbits(40):x}"}
+        return {"ok": True}
+
+    def start(self) -> int:
+        import uvicorn
+
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        config = uvicorn.Config(self.app, log_level="warning", lifespan="off", access_log=False)
+        self.server = uvicorn.Server(config)
+        threading.Thread(target=self.server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return port
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.should_exit = True
+
+
+class Contacts:
+    """
+    Sliding window of leads: one new lead every ``1 / churn`` turns, and writers are drawn
+    with a skew towards the newest of the ``window`` active leads.
+    """
+
+    def __init__(self, window: int, churn: float, locations: int, skew: float = 3.0) -> None:
+        self.window = window
+        self.churn = churn
+        self.locations = locations
+        self.skew = skew
+
+    def pick(self, turn: int) -> Tuple[str, str]:
+        newest = self.window + int(turn * self.churn)
+        lead = newest - int(self.window * random.random() ** self.skew)
+        return f"lead{lead:08d}", f"loc{lead % self.locations}"
+
+
+def _fd_counts() -> Tuple[Optional[int], Optional[int]]:
+    try:
+        names = os.listdir("/proc/self/fd")
+    except OSError:
+        return None, None
+    sockets = 0
+    for name in names:
+        try:
+            if os.readlink(f"/proc/self/fd/{name}").startswith("socket:"):
+                sockets += 1
+        except OSError:
+            pass
+    return len(names), sockets
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        import resource
+
+        # Peak, not current, outside Linux; still catches unbounded growth
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _growth(points: List[Tuple[float, float]]) -> float:
+    """
+    Growth per 100k turns of (turns, value) points: the last third's median over the first
+    third's, less the spread of the first third (pool sizes, in-flight runs and GC make
+    single samples noisy, so short runs don't fail on noise).
+    """
+    if len(points) < 3:
+        return 0.0
+    k = len(points) // 3
+    first, last = points[:k], points[-k:]
+    span = statistics.median(x for x, _ in last) - statistics.median(x for x, _ in first)
+    if span <= 0:
+        return 0.0
+    delta = statistics.median(y for _, y in last) - statistics.median(y for _, y in first)
+    noise = max(y for _, y in first) - min(y for _, y in first)
+    return max(delta - noise, 0.0) / span * 100_000
+
+
+class Sampler:
+    """Resource samples over the run, plus tracemalloc growth relative to the warm-up."""
+
+    def __init__(self, top: int, frames: int) -> None:
+        self.top = top
+        self.frames = frames
+        self.samples: List[Dict[str, Any]] = []
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.sites: List[str] = []
+
+    def sample(self, turns: int, rate: float, warm: bool) -> Dict[str, Any]:
+        fds, sockets = _fd_counts()
+        s: Dict[str, Any] = {
+            "t": round(time.monotonic(), 1),
+            "turns": turns,
+            "per_s": round(rate, 1),
+            # tracemalloc's own bookkeeping is not the app's
+            "rss_mb": round(_rss_mb() - tracemalloc.get_tracemalloc_memory() / 1e6, 1),
+            "fds": fds,
+            "sockets": sockets,
+            "tasks": len(asyncio.all_tasks()),
+            "warm": warm,
+        }
+        if warm and self.frames and not tracemalloc.is_tracing():
+            # Only after the warm-up: tracing makes every allocation several times slower.
+            # The heap is then what was allocated since and is still alive.
+            tracemalloc.start(self.frames)
+        elif tracemalloc.is_tracing():
+            s["heap_mb"] = round(tracemalloc.get_traced_memory()[0] / 1e6, 2)
+            snap = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, tracemalloc.__file__)])
+            if self.baseline is None:
+                self.baseline = snap
+            else:
+                stats = snap.compare_to(self.baseline, "lineno")[: self.top]
+                self.sites = [f"{st.size_diff / 1e3:+10.1f} kB {st.count_diff:+8d}  {st.traceback}"
+                               for st in stats if st.size_diff > 0]
+        self.samples.append(s)
+        return s
+
+    def growth_rates(self) -> Dict[str, float]:
+        warm = [s for s in self.samples if s["warm"]]
+        out: Dict[str, float] = {}
+        for key in LIMITS:
+            points = [(s["turns"], s[key]) for s in warm if s.get(key) is not None]
+            if points:
+                out[key] = round(_growth(points), 3)
+        return out
+
+
+def _line(s: Dict[str, Any]) -> str:
+    heap = f" heap={s['heap_mb']:.1f}MB" if "heap_mb" in s else ""
+    warm = "" if s["warm"] else " (warm-up)"
+    return (f"turns={s['turns']:>9} {s['per_s']:7.1f}/s rss={s['rss_mb']:.1f}MB{heap} "
+            f"fds={s['fds']} sockets={s['sockets']} tasks={s['tasks']}{warm}")
+
+
+async def soak(args: argparse.Namespace, fake_ghl: FakeGhl, sampler: Sampler) -> int:
+    """Run the turns; returns the number of webhooks answered with a non-200 status."""
+    import httpx
+
+    from app.web import webhook
+
+    contacts = Contacts(args.contacts, args.churn, args.locations)
+    sent = 0
+    last_ids: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def event(turn: int) -> Dict[str, Any]:
+        if last_ids and random.random() < args.redelivery:
+            # GHL redelivers: same messageId, must be deduplicated
+            return random.choice(list(last_ids.values())[-64:])
+        cid, loc = contacts.pick(turn)
+        text = random.choice(MESSAGES)
+        fake_ghl.add_message(f"conv-{cid}")
+        body = {"type": "InboundMessage", "locationId": loc, "contactId": cid,
+                "conversationId": f"conv-{cid}", "messageType": "SMS", "body": text,
+                "messageId": f"m{turn}"}
+        last_ids[body["messageId"]] = body
+        if len(last_ids) > 64:
+            last_ids.popitem(last=False)
+        return body
+
+    async with webhook.app.router.lifespan_context(webhook.app):
+        await webhook._ready.wait()
+        transport = httpx.ASGITransport(app=webhook.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://soak", timeout=60)
+        async with client:
+            errors = 0
+
+            async def worker() -> None:
+                nonlocal sent, errors
+                while sent < args.turns:
+                    turn = sent
+                    sent += 1
+                    r = await client.post("/webhooks/ghl", content=orjson.dumps(event(turn)))
+                    if r.status_code != 200:
+                        errors += 1
+
+            workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+            start = last_t = time.monotonic()
+            last_n = 0
+            while True:
+                done, _ = await asyncio.wait(workers, timeout=args.interval)
+                if len(done) == len(workers):
+                    break  # an idle process would skew the growth
+                now = time.monotonic()
+                rate = (sent - last_n) / max(now - last_t, 1e-9)
+                s = sampler.sample(sent, rate, sent >= args.warmup)
+                last_t, last_n = now, sent
+                print(_line(s), flush=True)
+                if args.max_seconds and now - start > args.max_seconds:
+                    sent = args.turns  # stop handing out turns; workers finish their current one
+            for w in workers:
+                w.result()
+            return errors
+
+
+def _locations_file(locations: int, port: int) -> str:
+    """GHL_LOCATIONS_FILE listing the fake locations (unlisted ones share the default tenant)."""
+    fd, path = tempfile.mkstemp(prefix="soak-locations-", suffix=".json")
+    creds = {f"loc{i}": {"api_key": f"soak-{i}", "base_url": f"http://127.0.0.1:{port}"}
+             for i in range(locations)}
+    with os.fdopen(fd, "wb") as f:
+        f.write(orjson.dumps(creds))
+    return path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--turns", type=int, default=1_000_000)
+    parser.add_argument(
+        "--warmup", type=int, default=None, help="turns before growth is measured (default 20%%)"
+    )
+    parser.add_argument(
+        "--max-seconds", type=float, default=0.0, help="stop early after this long (0 = no limit)"
+    )
+    parser.add_argument("--contacts", type=int, default=20_000, help="active leads at any time")
+    parser.add_argument("--churn", type=float, default=0.02, help="new leads per turn")
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--redelivery", type=float, default=0.01, help="share of duplicate webhook deliveries"
+    )
+    parser.add_argument("--ghl-ms", type=float, default=5.0, help="fake GHL latency")
+    parser.add_argument("--llm-ms", type=float, default=5.0, help="fake model latency")
+    parser.add_argument(
+        "--ttl", type=float, default=60.0, help="store/checkpoint TTLs during the soak (s)"
+    )
+    parser.add_argument("--interval", type=float, default=15.0, help="seconds between samples")
+    parser.add_argument(
+        "--tracemalloc", type=int, default=1,
+        help="frames per traced allocation after the warm-up (0 = off)",
+    )
+    parser.add_argument("--top", type=int, default=10, help="growing allocation sites to report")
+    for key, limit in LIMITS.items():
+        parser.add_argument(f"--max-{key.replace('_', '-')}", type=float, default=limit,
+                            help=f"max {key} growth per 100k turns (default {limit})")
+    parser.add_argument("--out", default=None, help="write samples and growth as JSON")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.warmup is None:
+        args.warmup = args.turns // 5
+    random.seed(args.seed)
+
+    fake_ghl = FakeGhl(args.ghl_ms, max_conversations=1024)
+    port = fake_ghl.start()
+
+    # The app reads its configuration at import time
+    os.environ.update({
+        "GHL_BASE_URL": f"http://127.0.0.1:{port}",
+        "GHL_API_KEY": "soak",
+        "GHL_WARM": "0",
+        "STORE_BACKEND": "memory",
+        "TRACE_EXPORT": "none",
+        "PROFILE_SAMPLE_RATE": "0",
+        "HANDOFF_DIR": tempfile.mkdtemp(prefix="soak-handoff-"),
+        "GHL_LOCATIONS_FILE": _locations_file(args.locations, port),
+    })
+    os.environ.pop("RECORD_DIR", None)
+    os.environ.pop("OPENAI_API_KEY", None)
+    for name in ("CONTACT_CACHE_TTL", "CONVERSATION_CACHE_TTL", "IDEMPOTENCY_TTL",
+                 "GHL_WRITE_DEDUPE_TTL", "CHECKPOINT_TTL", "TENANT_IDLE_TTL",
+                 "STORE_PURGE_INTERVAL"):
+        os.environ[name] = str(args.ttl)
+
+    from app.graph import graph
+
+    llm = FakeLLM(args.llm_ms)
+    graph.make_llms = lambda: (llm, llm)
+
+    sampler = Sampler(args.top, args.tracemalloc)
+    print(f"soak: {args.turns} turns ({args.warmup} warm-up), {args.contacts} active contacts, "
+          f"concurrency {args.concurrency}, fake GHL on :{port}", flush=True)
+    try:
+        errors = asyncio.run(soak(args, fake_ghl, sampler))
+    finally:
+        fake_ghl.stop()
+
+    limits = {key: getattr(args, f"max_{key}") for key in LIMITS}
+    growth = sampler.growth_rates()
+    failed = [key for key, value in growth.items() if value > limits[key]]
+    print("growth per 100k turns after warm-up:")
+    for key, value in growth.items():
+        flag = "  FAIL" if key in failed else ""
+        print(f"  {key:8} {value:+9.3f}  (limit {limits[key]:g}){flag}")
+    if sampler.sites:
+        print("top growing allocation sites since warm-up:")
+        for line in sampler.sites:
+            print(f"  {line}")
+    if args.out:
+        with open(args.out, "wb") as f:
+            f.write(orjson.dumps({"args": vars(args), "samples": sampler.samples, "growth": growth,
+                                  "limits": limits, "allocation_sites": sampler.sites,
+                                  "errors": errors},
+                                 option=orjson.OPT_INDENT_2))
+    if errors:
+        print(f"{errors} webhook(s) answered non-200", file=sys.stderr)
+        return 3
+    if len([s for s in sampler.samples if s["warm"]]) < 3:
+        print("too few samples after warm-up to measure growth; lower --interval or raise --turns",
+              file=sys.stderr)
+        return 1
+    return 2 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())